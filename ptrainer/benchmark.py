@@ -0,0 +1,369 @@
+from typing import Dict, List, Optional, Any, Callable
+from contextlib import contextmanager
+import csv
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+import frappe
+from frappe.utils import add_days, get_first_day_of_week, getdate, now_datetime, nowdate
+
+# Constants
+BENCH_EMAIL_DOMAIN = "bench.ptrainer.invalid"  # marks synthetic clients
+BENCH_PACKAGE = "Benchmark Package"
+MEALS = ("Breakfast", "Lunch", "Dinner", "Snack")
+MACRO_RANGES = {  # per 100g: (nutrient, unit, low, high)
+    'protein': ("Protein", "G", 0.5, 32),
+    'fat': ("Total lipid (fat)", "G", 0.2, 25),
+    'carbs': ("Carbohydrate, by difference", "G", 0, 75),
+}
+
+def read_records(filename: str) -> List[Dict[str, str]]:
+    """Rows of a bundled CSV from public/records"""
+    path = frappe.get_app_path("ptrainer", "public", "records", filename)
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+def ensure_benchmark_foods(rng: random.Random, count: int) -> List[str]:
+    """Insert foods from the bundled CSV with generated nutrition, skipping the FDC lookup"""
+    rows = read_records("foods.csv")[:count]
+    existing = set(frappe.get_all("Food", filters={"name": ["in", [r['fdcid'] for r in rows] or [""]]}, pluck="name"))
+
+    now = now_datetime()
+    user = frappe.session.user
+    foods, facts = [], []
+    for row in rows:
+        # Draw before skipping existing foods so reruns with the same seed consume the same stream
+        values = {macro: round(rng.uniform(low, high), 1) for macro, (_, _, low, high) in MACRO_RANGES.items()}
+        if row['fdcid'] in existing:
+            continue
+        energy = round(values['protein'] * 4 + values['carbs'] * 4 + values['fat'] * 9, 1)
+        foods.append((row['fdcid'], now, now, user, user, int(row['fdcid']), row['image'], 1,
+                      f"Food {row['fdcid']}", "Benchmark", f"Synthetic food {row['fdcid']}"))
+        nutrients = [(MACRO_RANGES[m][0], values[m], MACRO_RANGES[m][1]) for m in MACRO_RANGES]
+        nutrients.append(("Energy", energy, "KCAL"))
+        for idx, (nutrient, value, unit) in enumerate(nutrients, 1):
+            facts.append((frappe.generate_hash(length=10), now, now, user, user, row['fdcid'], "Food",
+                          "nutritional_facts", idx, nutrient, value, unit))
+
+    frappe.db.bulk_insert(
+        "Food",
+        ["name", "creation", "modified", "owner", "modified_by", "fdcid", "image", "enabled",
+         "title", "category", "description"],
+        foods
+    )
+    frappe.db.bulk_insert(
+        "Nutritional Facts",
+        ["name", "creation", "modified", "owner", "modified_by", "parent", "parenttype",
+         "parentfield", "idx", "nutrient", "value", "unit"],
+        facts
+    )
+    return [row['fdcid'] for row in rows]
+
+def ensure_benchmark_exercises(count: int) -> List[str]:
+    """Insert exercises from the bundled CSV"""
+    names = []
+    for row in read_records("exercises.csv")[:count]:
+        if not row['Exercise']:
+            continue
+        if not frappe.db.exists("Exercise", row['Exercise']):
+            exercise = frappe.get_doc({
+                "doctype": "Exercise",
+                "exercise": row['Exercise'],
+                "category": row['Category'],
+                "equipment": row['Equipment'],
+                "instructions": row['Instructions'],
+                "force": row['Force'],
+                "level": row['Level'],
+                "mechanic": row['Mechanic'],
+                "primary_muscle": row['PrimaryMuscle'],
+                "enabled": 1,
+            })
+            if row['Muscle (Secondary Muscles)']:
+                exercise.append("secondary_muscles", {"muscle": row['Muscle (Secondary Muscles)'].strip()})
+            exercise.insert(ignore_permissions=True)
+        names.append(row['Exercise'])
+    return names
+
+def ensure_benchmark_package(weeks: int) -> str:
+    if not frappe.db.exists("PT Package", BENCH_PACKAGE):
+        frappe.get_doc({
+            "doctype": "PT Package",
+            "title": BENCH_PACKAGE,
+            "duration": weeks * 7 * 86400,
+            "rate": 0,
+            "workout_plan": 1,
+            "meal_plan": 1,
+            "enabled": 1,
+        }).insert(ignore_permissions=True)
+    else:
+        frappe.db.set_value("PT Package", BENCH_PACKAGE, "duration", weeks * 7 * 86400)
+    return BENCH_PACKAGE
+
+def generate_synthetic_data(clients: int = 20, weeks: int = 8, logs: int = 50, seed: int = 42,
+                            foods: int = 60, exercises: int = 120) -> Dict[str, int]:
+    """
+    Create synthetic clients with memberships, weekly plans and logs
+    Args:
+        clients (int): Number of clients, each with one membership
+        weeks (int): Weekly plans per membership
+        logs (int): Performance logs per client
+        seed (int): Random seed, the same seed always produces the same records
+        foods (int): Foods taken from public/records/foods.csv
+        exercises (int): Exercises taken from public/records/exercises.csv
+    Returns:
+        dict: Number of records created per doctype
+    """
+    rng = random.Random(seed)
+    clear_synthetic_data()
+
+    food_names = ensure_benchmark_foods(rng, foods)
+    exercise_names = ensure_benchmark_exercises(exercises)
+    package = ensure_benchmark_package(weeks)
+
+    # Memberships started half way through so plans are past, current and scheduled
+    membership_start = get_first_day_of_week(add_days(getdate(nowdate()), -7 * (weeks // 2)))
+    plan_count = 0
+
+    for i in range(clients):
+        workouts = rng.randint(3, 6)
+        meals = rng.randint(3, 4)
+        client = frappe.get_doc({
+            "doctype": "Client",
+            "client_name": f"Bench{i:04d} Client",
+            "email": f"client{i:04d}@{BENCH_EMAIL_DOMAIN}",
+            "gender": rng.choice(["Male", "Female"]),
+            "date_of_birth": add_days("1990-01-01", rng.randint(0, 9000)),
+            "height": rng.randint(150, 200),
+            "goal": rng.choice(["Weight Loss", "Weight Gain", "Maintenance", "Muscle Building"]),
+            "activity_level": rng.choice(["Sedentary", "Light", "Moderate", "Very Active"]),
+            "equipment": rng.choice(["Home", "Gym"]),
+            "workouts": workouts,
+            "meals": meals,
+            "enabled": 1,
+        })
+        weight = rng.uniform(55, 110)
+        for day in range(0, weeks * 7, 3):
+            weight += rng.uniform(-0.6, 0.5)
+            client.append("weight", {"date": add_days(membership_start, day), "weight": round(weight, 1)})
+
+        client_exercises = rng.sample(exercise_names, min(len(exercise_names), 12))
+        for n in range(logs):
+            client.append("exercise_performance", {
+                "exercise": rng.choice(client_exercises),
+                "weight": rng.randint(4, 40) * 2.5,
+                "reps": rng.randint(4, 15),
+                "date": add_days(membership_start, n * weeks * 7 // max(logs, 1)),
+            })
+        client.insert(ignore_permissions=True)
+
+        membership = frappe.get_doc({
+            "doctype": "Membership",
+            "client": client.name,
+            "package": package,
+            "start": membership_start,
+        }).insert(ignore_permissions=True)
+
+        for _ in range(weeks):
+            plan = frappe.get_doc({"doctype": "Plan", "client": client.name, "membership": membership.name})
+            for day in range(1, 8):
+                for meal in MEALS[:meals]:
+                    for food in rng.sample(food_names, 2):
+                        plan.append(f"d{day}_f", {"meal": meal, "food": food, "amount": rng.randint(5, 30) * 10})
+                if day <= workouts:
+                    for exercise in rng.sample(client_exercises, 5):
+                        plan.append(f"d{day}_e", {
+                            "exercise": exercise,
+                            "sets": rng.randint(3, 5),
+                            "reps": rng.randint(6, 12),
+                            "rest": 90,
+                            "super": 0,
+                        })
+            plan.insert(ignore_permissions=True)
+            plan_count += 1
+
+    frappe.db.commit()
+    return {'foods': len(food_names), 'exercises': len(exercise_names), 'clients': clients,
+            'memberships': clients, 'plans': plan_count}
+
+def get_synthetic_clients() -> List[str]:
+    return frappe.get_all("Client", filters={"email": ["like", f"%@{BENCH_EMAIL_DOMAIN}"]}, pluck="name")
+
+def clear_synthetic_data() -> int:
+    """Delete synthetic clients with their memberships and plans, library items are kept"""
+    clients = get_synthetic_clients()
+    if not clients:
+        return 0
+    for plan in frappe.get_all("Plan", filters={"client": ["in", clients]}, pluck="name"):
+        frappe.delete_doc("Plan", plan, ignore_permissions=True, force=True)
+    for membership in frappe.get_all("Membership", filters={"client": ["in", clients]}, pluck="name"):
+        frappe.delete_doc("Membership", membership, ignore_permissions=True, force=True)
+    for client in clients:
+        frappe.delete_doc("Client", client, ignore_permissions=True, force=True)
+    frappe.db.commit()
+    return len(clients)
+
+@contextmanager
+def count_queries():
+    """Count SQL queries run through frappe.db.sql inside the block"""
+    counter = {'queries': 0}
+    original_sql = frappe.db.sql
+
+    def counting_sql(*args, **kwargs):
+        counter['queries'] += 1
+        return original_sql(*args, **kwargs)
+
+    frappe.db.sql = counting_sql
+    try:
+        yield counter
+    finally:
+        frappe.db.sql = original_sql
+
+def trace_peak_memory(function: Callable[[], Any]) -> int:
+    """Peak memory allocated while running function, in bytes"""
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def measure(function: Callable[[], Any], repeat: int = 1) -> Dict[str, Any]:
+    """
+    Wall time and query count averaged over repeat runs, and peak memory
+    A single run is traced for memory, repeated runs are timed without tracing and traced once more
+    """
+    if repeat == 1:
+        with count_queries() as counter:
+            started = time.perf_counter()
+            peak = trace_peak_memory(function)
+            elapsed = time.perf_counter() - started
+    else:
+        with count_queries() as counter:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                function()
+            elapsed = time.perf_counter() - started
+        peak = trace_peak_memory(function)
+
+    return {
+        'seconds': round(elapsed / repeat, 6),
+        'queries': counter['queries'] // repeat,
+        'peak_kb': round(peak / 1024, 1),
+        'repeat': repeat,
+    }
+
+def clear_library_caches() -> None:
+    """Drop library items from Redis and every worker, as after a deploy"""
+    from ptrainer.ptrainer_methods import LIBRARY_GENERATION_KEY, _local_library_caches
+
+    cache = frappe.cache()
+    cache.delete_keys("library:")
+    cache.incr(cache.make_key(LIBRARY_GENERATION_KEY))
+    _local_library_caches.clear()
+    frappe.local.ptrainer_library_generation = None
+
+def get_benchmarks(memberships: List[str]) -> Dict[str, Dict[str, Callable[[], Any]]]:
+    """Hot paths to time, each with a setup that makes the run cold"""
+    from ptrainer.ptrainer_methods import (
+        MembershipCache, get_membership, process_plans_batch, extract_base_nutrition
+    )
+    from ptrainer.config.nutrition import get_nutrient_mappings
+    from ptrainer.ptrainer.doctype.plan.plan import calculate_all_nutritional_totals, FOOD_TABLES
+
+    cache = MembershipCache()
+    plan_names = frappe.get_all("Plan", filters={"membership": ["in", memberships]}, pluck="name")
+    plan_docs = [frappe.get_doc("Plan", name) for name in plan_names]
+    food_docs = [frappe.get_doc("Food", name) for name in
+                 {row.food for plan in plan_docs for table in FOOD_TABLES for row in plan.get(table)}]
+    food_data = {
+        table: [{'food_docname': row.food, 'amount_in_grams': row.amount} for row in plan_docs[0].get(table)]
+        for table in FOOD_TABLES
+    } if plan_docs else {}
+    nutrient_mappings = get_nutrient_mappings()
+
+    def invalidate_memberships():
+        cache.invalidate_tags([f"membership:{m}" for m in memberships])
+
+    def load_memberships():
+        for membership in memberships:
+            get_membership(membership)
+
+    return {
+        'get_membership': {'setup': lambda: (clear_library_caches(), invalidate_memberships()), 'run': load_memberships},
+        'process_plans_batch': {'setup': clear_library_caches, 'run': lambda: process_plans_batch(plan_docs)},
+        'calculate_all_nutritional_totals': {'setup': None, 'run': lambda: calculate_all_nutritional_totals(food_data)},
+        'extract_base_nutrition': {
+            'setup': None,
+            'run': lambda: [extract_base_nutrition(food, nutrient_mappings) for food in food_docs]
+        },
+        'importer_parse': {'setup': None, 'run': lambda: (read_records("exercises.csv"), read_records("foods.csv"))},
+    }
+
+def run_benchmarks(repeat: int = 5, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Time each hot path once cold and repeat times warm on the synthetic data
+    Args:
+        repeat (int): Warm runs averaged per benchmark
+        only (list): Benchmark names to run, all when empty
+    Returns:
+        dict: Environment details and results per benchmark
+    """
+    clients = get_synthetic_clients()
+    if not clients:
+        frappe.throw("No synthetic data found, run generate_synthetic_data first.")
+    memberships = frappe.get_all("Membership", filters={"client": ["in", clients]}, pluck="name")
+
+    results = {}
+    for name, benchmark in get_benchmarks(memberships).items():
+        if only and name not in only:
+            continue
+        if benchmark['setup']:
+            benchmark['setup']()
+        results[name] = {
+            'cold': measure(benchmark['run']),
+            'warm': measure(benchmark['run'], repeat),
+        }
+
+    return {
+        'meta': {
+            'site': frappe.local.site,
+            'timestamp': str(now_datetime()),
+            'python': platform.python_version(),
+            'frappe': frappe.__version__,
+            'clients': len(clients),
+            'memberships': len(memberships),
+            'plans': frappe.db.count("Plan", {"client": ["in", clients]}),
+        },
+        'results': results,
+    }
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Relative change of every metric against a previous results file, positive is slower"""
+    changes = {}
+    for name, phases in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        changes[name] = {
+            phase: {
+                metric: round((values[metric] - previous[phase][metric]) / previous[phase][metric] * 100, 1)
+                for metric in ('seconds', 'queries', 'peak_kb')
+                if previous.get(phase, {}).get(metric)
+            }
+            for phase, values in phases.items()
+        }
+    return changes
+
+def write_results(results: Dict[str, Any], path: Optional[str] = None) -> str:
+    """Write results as JSON, by default to the site's private files"""
+    if not path:
+        timestamp = now_datetime().strftime("%Y%m%d-%H%M%S")
+        path = frappe.get_site_path("private", "files", f"ptrainer-benchmark-{timestamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1, default=str)
+    return path
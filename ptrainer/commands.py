@@ -0,0 +1,162 @@
+import click
+import frappe
+from frappe.commands import pass_context
+from frappe.exceptions import SiteNotSpecifiedError
+
+@click.command("warm-cache")
+@click.option("--concurrency", default=4, type=int, help="Memberships rebuilt in parallel")
+@pass_context
+def warm_cache(context, concurrency):
+    """Preload library items and rebuild active membership payloads"""
+    from ptrainer.warmup import warm_up_cache
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            result = warm_up_cache(
+                concurrency,
+                lambda done, total: click.echo(f"\r{site}: {done}/{total} memberships", nl=False)
+            )
+            click.echo(
+                f"\n{site}: cached {result['exercises']} exercises, {result['foods']} foods and "
+                f"{result['memberships']} memberships ({result['errors']} errors) in {result['elapsed']}s"
+            )
+        finally:
+            frappe.destroy()
+
+@click.command("generate-benchmark-data")
+@click.option("--clients", default=20, type=int, help="Synthetic clients, one membership each")
+@click.option("--weeks", default=8, type=int, help="Weekly plans per membership")
+@click.option("--logs", default=50, type=int, help="Performance logs per client")
+@click.option("--seed", default=42, type=int, help="Random seed")
+@click.option("--clear", is_flag=True, default=False, help="Only delete previously generated data")
+@pass_context
+def generate_benchmark_data(context, clients, weeks, logs, seed, clear):
+    """Create deterministic synthetic clients, memberships, plans and logs for benchmarks"""
+    from ptrainer.benchmark import generate_synthetic_data, clear_synthetic_data
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        frappe.set_user("Administrator")
+        try:
+            if clear:
+                click.echo(f"{site}: deleted {clear_synthetic_data()} synthetic clients")
+                continue
+            result = generate_synthetic_data(clients, weeks, logs, seed)
+            click.echo(f"{site}: " + ", ".join(f"{count} {doctype}" for doctype, count in result.items()))
+        finally:
+            frappe.destroy()
+
+@click.command("run-benchmarks")
+@click.option("--repeat", default=5, type=int, help="Warm runs averaged per benchmark")
+@click.option("--only", multiple=True, help="Benchmark to run, can be given several times")
+@click.option("--output", default=None, help="Results file, defaults to the site's private files")
+@click.option("--compare", "baseline", default=None, type=click.Path(exists=True), help="Previous results file")
+@pass_context
+def run_benchmarks(context, repeat, only, output, baseline):
+    """Time hot paths cold and warm on the synthetic data and write JSON results"""
+    import json
+    from ptrainer.benchmark import run_benchmarks, write_results, compare_results
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        frappe.set_user("Administrator")
+        try:
+            results = run_benchmarks(repeat, list(only))
+            for name, phases in results['results'].items():
+                click.echo(
+                    f"{name:<34} cold {phases['cold']['seconds']:>9.4f}s {phases['cold']['queries']:>5}q  "
+                    f"warm {phases['warm']['seconds']:>9.4f}s {phases['warm']['queries']:>5}q  "
+                    f"peak {phases['cold']['peak_kb']:>9.1f} KB"
+                )
+            if baseline:
+                with open(baseline) as f:
+                    results['changes'] = compare_results(results, json.load(f))
+                for name, phases in results['changes'].items():
+                    click.echo(f"{name:<34} change vs baseline (%): {phases}")
+            click.echo(f"Results written to {write_results(results, output)}")
+        finally:
+            frappe.destroy()
+
+@click.command("load-test")
+@click.option("--concurrency", default=50, type=int, help="Simultaneous HTTP clients")
+@click.option("--duration", default=30, type=float, help="Seconds per phase")
+@click.option("--mix", default="skewed", type=click.Choice(["uniform", "skewed"]), help="Membership selection")
+@click.option("--write-interval", default=2.0, type=float, help="Seconds between plan edits, 0 to skip the write phase")
+@click.option("--url", default=None, help="Site URL, defaults to the configured host name")
+@click.option("--synthetic-only", is_flag=True, default=False, help="Only use generated benchmark memberships")
+@click.option("--output", default=None, help="Also write the report as JSON")
+@pass_context
+def load_test(context, concurrency, duration, mix, write_interval, url, synthetic_only, output):
+    """Load test the get_membership endpoint of a running site"""
+    from ptrainer.loadtest import run_load_test
+    from ptrainer.benchmark import write_results
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        frappe.set_user("Administrator")
+        try:
+            report = run_load_test(concurrency, duration, mix, write_interval, url, synthetic_only)
+            click.echo(
+                f"{site}: {report['memberships']} memberships, {report['mix']} mix, "
+                f"queries per request {report['queries_per_request']}"
+            )
+            for phase in report['phases']:
+                latency = phase['latency_ms']
+                click.echo(
+                    f"{phase['phase']:<7} {phase['requests']:>7} req {phase['errors']:>5} err "
+                    f"{phase['throughput']:>8} req/s  p50 {latency['p50']}ms  p95 {latency['p95']}ms  "
+                    f"p99 {latency['p99']}ms  max {latency['max']}ms"
+                )
+                for bucket, count in latency['histogram'].items():
+                    if count:
+                        click.echo(f"    {bucket:>9} {count:>7} {'#' * max(1, count * 50 // (phase['requests'] or 1))}")
+            if output:
+                click.echo(f"Report written to {write_results(report, output)}")
+        finally:
+            frappe.destroy()
+
+@click.command("export-history")
+@click.option("--client", "clients", multiple=True, help="Client to export, can be given several times, all by default")
+@click.option("--format", "export_format", default="ndjson", type=click.Choice(["ndjson", "csv"]), help="Output format")
+@click.option("--output", default=None, help="Output file, stdout by default")
+@pass_context
+def export_history(context, clients, export_format, output):
+    """Stream the full history of clients as NDJSON or CSV"""
+    import sys
+    from ptrainer.export import stream_export
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            out = open(output, "w", newline="") if output else sys.stdout
+            try:
+                for line in stream_export(list(clients) or None, export_format):
+                    out.write(line)
+            finally:
+                if output:
+                    out.close()
+        finally:
+            frappe.destroy()
+
+commands = [warm_cache, generate_benchmark_data, run_benchmarks, load_test, export_history]
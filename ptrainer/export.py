@@ -0,0 +1,175 @@
+from typing import Dict, List, Optional, Any, Iterator, Iterable
+from itertools import islice
+import csv
+import io
+import json
+import frappe
+from ptrainer.ptrainer.doctype.client.client import get_client_summaries
+
+# Constants
+CHUNK_SIZE = 500
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# Columns of the CSV export, one row per record of any type
+CSV_COLUMNS = (
+    "type", "client", "client_name", "membership", "plan", "day", "date", "start", "end", "status",
+    "active", "package",
+    "meal", "food", "amount", "exercise", "sets", "reps", "rest", "super", "weight"
+)
+
+def iter_chunks(doctype: str, filters: Dict[str, Any], fields: List[str], order_by: str) -> Iterator[Any]:
+    """Rows of a query fetched CHUNK_SIZE at a time"""
+    start = 0
+    while True:
+        rows = frappe.get_all(
+            doctype,
+            filters=filters,
+            fields=fields,
+            order_by=order_by,
+            limit_start=start,
+            limit_page_length=CHUNK_SIZE
+        )
+        yield from rows
+        if len(rows) < CHUNK_SIZE:
+            return
+        start += CHUNK_SIZE
+
+def iter_plan_records(client_id: str) -> Iterator[Dict[str, Any]]:
+    """Plans of a client, each chunk of plans followed by its food and exercise rows"""
+    plans = iter_chunks(
+        "Plan",
+        {"client": client_id},
+        ["name", "membership", "start", "end", "status", "target_proteins", "target_carbs",
+         "target_fats", "target_energy", "target_water"],
+        "start asc, name asc"
+    )
+    while chunk := list(islice(plans, CHUNK_SIZE)):
+        for plan in chunk:
+            yield {"type": "plan", "client": client_id, "plan": plan.name,
+                   **{k: v for k, v in plan.items() if k != "name"}}
+
+        parents = [plan.name for plan in chunk]
+        for child_doctype, record_type, fields in (
+            ("Foods", "plan_food", ["meal", "food", "amount"]),
+            ("Exercises", "plan_exercise", ["exercise", "sets", "reps", "rest", "super"]),
+        ):
+            for row in iter_chunks(
+                child_doctype,
+                {"parenttype": "Plan", "parent": ["in", parents]},
+                ["parent", "parentfield", *fields],
+                "parent asc, parentfield asc, idx asc"
+            ):
+                yield {
+                    "type": record_type,
+                    "client": client_id,
+                    "plan": row.parent,
+                    "day": int(row.parentfield[1]),  # dN_f / dN_e
+                    **{field: row.get(field) for field in fields}
+                }
+
+def iter_client_records(client: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Full history of one client as flat records
+    Args:
+        client: Client summary row from get_client_summaries
+    Yields:
+        dict: client, membership, plan, plan_food, plan_exercise, weight and performance records
+    """
+    yield {"type": "client", "client": client.name, **{k: v for k, v in client.items() if k != "name"}}
+
+    for membership in iter_chunks(
+        "Membership",
+        {"client": client.name},
+        ["name", "package", "start", "end", "active"],
+        "start asc, name asc"
+    ):
+        yield {"type": "membership", "client": client.name, "membership": membership.name,
+               **{k: v for k, v in membership.items() if k != "name"}}
+
+    yield from iter_plan_records(client.name)
+
+    for record_type, child_doctype, fields in (
+        ("weight", "Weight Log", ["date", "weight"]),
+        ("performance", "Performance Log", ["date", "exercise", "weight", "reps"]),
+    ):
+        for row in iter_chunks(
+            child_doctype,
+            {"parenttype": "Client", "parent": client.name},
+            fields,
+            "date asc, idx asc"
+        ):
+            yield {"type": record_type, "client": client.name, **row}
+
+def iter_export_records(clients: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Records of the given clients, or of every client, loading client rows a chunk at a time"""
+    if clients is None:
+        clients = (row.name for row in iter_chunks("Client", {}, ["name"], "name asc"))
+
+    clients = iter(clients)
+    while chunk := list(islice(clients, CHUNK_SIZE)):
+        summaries = get_client_summaries(chunk)
+        for client_id in chunk:
+            if client_id in summaries:
+                yield from iter_client_records(summaries[client_id])
+
+def serialize_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, default=str) + "\n"
+
+def serialize_csv(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """CSV lines with CSV_COLUMNS, fields a record type doesn't have are left empty"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_export(clients: Optional[Iterable[str]] = None, format: str = "ndjson") -> Iterator[str]:
+    """Serialized export lines, produced lazily"""
+    if format not in EXPORT_FORMATS:
+        frappe.throw(f"Unsupported export format: {format}")
+    records = iter_export_records(clients)
+    return serialize_csv(records) if format == "csv" else serialize_ndjson(records)
+
+def close_after(lines: Iterator[str]) -> Iterator[bytes]:
+    """
+    Stream lines as the response body
+    Frappe closes the request's connection before the body is sent, the first query reconnects
+    """
+    try:
+        for line in lines:
+            yield line.encode()
+    finally:
+        if frappe.db:
+            frappe.db.close()
+
+@frappe.whitelist()
+def export_client_history(client: Optional[str] = None, format: str = "ndjson"):
+    """
+    Download a client's full history, or every client's for System Managers, as NDJSON or CSV
+    Args:
+        client (str): Client to export, all clients when empty
+        format (str): "ndjson" or "csv"
+    """
+    from werkzeug.wrappers import Response
+
+    if client:
+        frappe.has_permission("Client", "read", doc=client, throw=True)
+        clients = [client]
+    else:
+        frappe.only_for("System Manager")
+        clients = None
+
+    lines = stream_export(clients, format)
+    filename = f"{client or 'clients'}-history.{format}"
+    response = Response(
+        close_after(lines),
+        mimetype="application/x-ndjson" if format == "ndjson" else "text/csv",
+        direct_passthrough=True
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
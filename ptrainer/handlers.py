@@ -1,29 +1,70 @@
 from .ptrainer_methods import MembershipCache
+from ptrainer.ptrainer.doctype.exercise.exercise import invalidate_exercise_facet_index
+from ptrainer.ptrainer.doctype.exercise_template.exercise_template import invalidate_template_rows
+from ptrainer.search import update_search_index, record_link_usage
+from ptrainer.performance import update_performance_series, invalidate_performance_series
+from ptrainer.weight_trend import update_weight_trend, invalidate_weight_trend
+from ptrainer.overview import invalidate_trainer_overview
 import frappe
 
+def rebuild_dependents(item_type, item_id):
+    """Invalidate memberships embedding a library item and rebuild them once the edit is committed"""
+    memberships = MembershipCache().invalidate_library_dependents(item_type, item_id)
+    if memberships:
+        frappe.enqueue(
+            "ptrainer.warmup.rebuild_memberships",
+            memberships=memberships,
+            queue="short",
+            enqueue_after_commit=True
+        )
+
 def on_plan_update(doc, method):
     """Handle plan updates"""
     cache = MembershipCache()
     cache.invalidate_membership_cache(doc.membership)
+    invalidate_trainer_overview()
+    if method == "on_update":
+        record_link_usage(doc)
 
 def on_membership_update(doc, method):
     """Handle membership updates"""
     cache = MembershipCache()
     cache.invalidate_membership_cache(doc.name)
+    invalidate_trainer_overview()
 
 def on_client_update(doc, method):
     """Handle client updates"""
     cache = MembershipCache()
     cache.invalidate_client_caches(doc.name)
+    invalidate_trainer_overview()
+    if method == "on_update":
+        update_performance_series(doc)
+        update_weight_trend(doc)
+    else:
+        invalidate_performance_series(doc.name)
+        invalidate_weight_trend(doc.name)
+
+def on_package_update(doc, method):
+    """Handle package updates"""
+    cache = MembershipCache()
+    cache.invalidate_package_caches(doc.name)
 
 def on_exercise_update(doc, method):
     """Handle exercise library updates"""
+    invalidate_exercise_facet_index()
+    update_search_index("Exercise", doc.name)
     cache = MembershipCache()
-    if cache.get_cached_library_item("Exercise", doc.name):
-        frappe.cache().delete_value(cache.get_library_cache_key("Exercise", doc.name))
+    cache.invalidate_library_item("Exercise", doc.name)
+    rebuild_dependents("Exercise", doc.name)
 
 def on_food_update(doc, method):
     """Handle food library updates"""
+    update_search_index("Food", doc.name)
     cache = MembershipCache()
-    if cache.get_cached_library_item("Food", doc.name):
-        frappe.cache().delete_value(cache.get_library_cache_key("Food", doc.name))
\ No newline at end of file
+    cache.invalidate_library_item("Food", doc.name)
+    rebuild_dependents("Food", doc.name)
+    invalidate_trainer_overview()
+
+def on_exercise_template_update(doc, method):
+    """Handle exercise template updates"""
+    invalidate_template_rows(doc.name)
\ No newline at end of file
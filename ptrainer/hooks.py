@@ -156,12 +156,22 @@ doc_events = {
         "after_insert": "ptrainer.handlers.on_client_update",
         "on_trash": "ptrainer.handlers.on_client_update"
     },
+    "PT Package": {
+        "on_update": "ptrainer.handlers.on_package_update",
+        "on_trash": "ptrainer.handlers.on_package_update"
+    },
     # Library items with less frequent updates
     "Exercise": {
-        "on_update": "ptrainer.handlers.on_exercise_update"
+        "on_update": "ptrainer.handlers.on_exercise_update",
+        "on_trash": "ptrainer.handlers.on_exercise_update"
+    },
+    "Exercise Template": {
+        "on_update": "ptrainer.handlers.on_exercise_template_update",
+        "on_trash": "ptrainer.handlers.on_exercise_template_update"
     },
     "Food": {
-        "on_update": "ptrainer.handlers.on_food_update"
+        "on_update": "ptrainer.handlers.on_food_update",
+        "on_trash": "ptrainer.handlers.on_food_update"
     }
 }
 
@@ -172,12 +182,17 @@ scheduler_events = {
 	# "all": [
 	# 	"ptrainer.tasks.all"
 	# ],
-	# "daily": [
-	# 	"ptrainer.tasks.daily"
-	# ],
+	"cron": {
+		"* * * * *": [
+			"ptrainer.ptrainer.doctype.membership.membership.process_due_memberships"
+		],
+	},
 	"hourly": [
 		"ptrainer.ptrainer.doctype.membership.membership.update_membership_statuses"
 	],
+	"daily_long": [
+		"ptrainer.warmup.scheduled_warm_up"
+	],
 # 	"weekly": [
 # 		"ptrainer.tasks.weekly"
 # 	],
@@ -191,6 +206,14 @@ scheduler_events = {
 
 # before_tests = "ptrainer.install.before_tests"
 
+# Migration
+# ---------
+
+after_migrate = [
+	"ptrainer.ptrainer.doctype.membership.membership.rebuild_membership_queue",
+	"ptrainer.warmup.after_migrate"
+]
+
 # Overriding Methods
 # ------------------------------
 #
@@ -217,12 +240,12 @@ scheduler_events = {
 # Request Events
 # ----------------
 # before_request = ["ptrainer.utils.before_request"]
-# after_request = ["ptrainer.utils.after_request"]
+after_request = ["ptrainer.metrics.flush"]
 
 # Job Events
 # ----------
 # before_job = ["ptrainer.utils.before_job"]
-# after_job = ["ptrainer.utils.after_job"]
+after_job = ["ptrainer.metrics.flush"]
 
 # User Data Protection
 # --------------------
@@ -258,7 +281,7 @@ scheduler_events = {
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+	"Profile Log": 14  # days to retain logs
+}
 
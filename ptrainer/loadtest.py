@@ -0,0 +1,215 @@
+from typing import Dict, List, Optional, Any
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+import math
+import random
+import threading
+import time
+import requests
+import frappe
+from frappe.utils import get_url
+
+# Constants
+ENDPOINT = "/api/method/ptrainer.ptrainer_methods.get_membership"
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 75, 100, 150, 250, 500, 750, 1000, 2500, 5000, 10000)
+HOT_FRACTION = 0.2  # share of memberships that receive HOT_SHARE of the traffic in the skewed mix
+HOT_SHARE = 0.8
+REQUEST_TIMEOUT = 30
+PROBE_SAMPLE = 10  # memberships loaded in-process to count queries per request
+
+class LatencyHistogram:
+    """Latency samples with fixed millisecond buckets for reporting"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self.lock = threading.Lock()
+
+    def record(self, milliseconds: float) -> None:
+        with self.lock:
+            self.samples.append(milliseconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return round(ordered[min(len(ordered) - 1, max(math.ceil(p / 100 * len(ordered)) - 1, 0))], 1)
+
+    def buckets(self) -> Dict[str, int]:
+        """Request count per latency bucket, the last bucket is everything slower"""
+        counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        for sample in self.samples:
+            counts[bisect_left(HISTOGRAM_BOUNDS_MS, sample)] += 1
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        return dict(zip(labels, counts))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': round(max(self.samples), 1) if self.samples else None,
+            'histogram': self.buckets(),
+        }
+
+class MembershipMix:
+    """Picks the membership for each request, uniformly or skewed towards a hot subset"""
+
+    def __init__(self, memberships: List[str], mix: str = "uniform", seed: int = 42):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.mix = mix
+        shuffled = sorted(memberships)
+        self.rng.shuffle(shuffled)
+        hot_count = max(1, int(len(shuffled) * HOT_FRACTION))
+        self.hot, self.cold = shuffled[:hot_count], shuffled[hot_count:] or shuffled[:hot_count]
+        self.all = shuffled
+
+    def next(self) -> str:
+        with self.lock:
+            if self.mix == "skewed":
+                return self.rng.choice(self.hot if self.rng.random() < HOT_SHARE else self.cold)
+            return self.rng.choice(self.all)
+
+def drive_requests(base_url: str, mix: MembershipMix, concurrency: int, duration: float,
+                   histogram: LatencyHistogram) -> Dict[str, int]:
+    """Run concurrent HTTP clients against get_membership until the duration has passed"""
+    deadline = time.monotonic() + duration
+    counters = {'requests': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        requests_done = errors = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = session.get(f"{base_url}{ENDPOINT}", params={"membership": mix.next()},
+                                       timeout=REQUEST_TIMEOUT)
+                failed = response.status_code != 200 or "message" in (response.json().get("message") or {})
+            except (requests.RequestException, ValueError):
+                failed = True
+            histogram.record((time.perf_counter() - started) * 1000)
+            requests_done += 1
+            errors += failed
+        with lock:
+            counters['requests'] += requests_done
+            counters['errors'] += errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+    return counters
+
+def edit_plans(site: str, plans: List[str], interval: float, stop: threading.Event, seed: int) -> None:
+    """Save a random plan every interval seconds, invalidating its membership like a trainer edit"""
+    frappe.init(site=site)
+    frappe.connect()
+    frappe.set_user("Administrator")
+    rng = random.Random(seed)
+    try:
+        while not stop.wait(interval):
+            plan = frappe.get_doc("Plan", rng.choice(plans))
+            plan.save(ignore_permissions=True)
+            frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+def count_membership_queries(memberships: List[str]) -> Dict[str, float]:
+    """Average SQL queries of an in-process get_membership call, cache-cold and warm"""
+    from ptrainer.benchmark import count_queries
+    from ptrainer.ptrainer_methods import MembershipCache, get_membership
+
+    sample = memberships[:PROBE_SAMPLE]
+    if not sample:
+        return {'cold': 0, 'warm': 0}
+    MembershipCache().invalidate_tags([f"membership:{m}" for m in sample])
+
+    result = {}
+    for phase in ("cold", "warm"):
+        with count_queries() as counter:
+            for membership in sample:
+                get_membership(membership)
+        result[phase] = round(counter['queries'] / len(sample), 1)
+    return result
+
+def run_phase(name: str, base_url: str, mix: MembershipMix, concurrency: int, duration: float,
+              writer: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run one load phase, optionally with a background plan editor"""
+    histogram = LatencyHistogram()
+    stop = threading.Event()
+    editor = None
+    if writer:
+        editor = threading.Thread(
+            target=edit_plans,
+            args=(frappe.local.site, writer['plans'], writer['interval'], stop, writer['seed']),
+            daemon=True
+        )
+        editor.start()
+
+    started = time.monotonic()
+    try:
+        counters = drive_requests(base_url, mix, concurrency, duration, histogram)
+    finally:
+        stop.set()
+        if editor:
+            editor.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        'phase': name,
+        'concurrency': concurrency,
+        'requests': counters['requests'],
+        'errors': counters['errors'],
+        'throughput': round(counters['requests'] / elapsed, 1) if elapsed else 0,
+        'latency_ms': histogram.summary(),
+    }
+
+def run_load_test(concurrency: int = 50, duration: float = 30, mix: str = "skewed",
+                  write_interval: float = 2.0, base_url: Optional[str] = None,
+                  synthetic_only: bool = False, seed: int = 42) -> Dict[str, Any]:
+    """
+    Load test the guest get_membership endpoint of a running bench site
+    Args:
+        concurrency (int): Simultaneous HTTP clients
+        duration (float): Seconds per phase
+        mix (str): "uniform" or "skewed" membership selection
+        write_interval (float): Seconds between plan edits in the write phase, 0 skips the phase
+        base_url (str): Site URL, defaults to the site's configured URL
+        synthetic_only (bool): Only use memberships created by ptrainer.benchmark
+        seed (int): Random seed for the membership mix and edits
+    Returns:
+        dict: Latency percentiles, histograms and throughput per phase, with queries per request
+    """
+    from ptrainer.ptrainer_methods import MembershipCache
+
+    filters = {"active": 1}
+    if synthetic_only:
+        from ptrainer.benchmark import get_synthetic_clients
+        filters["client"] = ["in", get_synthetic_clients() or [""]]
+    memberships = frappe.get_all("Membership", filters=filters, pluck="name")
+    if not memberships:
+        frappe.throw("No active memberships to load test.")
+
+    base_url = (base_url or get_url()).rstrip("/")
+    membership_mix = MembershipMix(memberships, mix, seed)
+    queries = count_membership_queries(memberships)
+
+    # Cold: every payload has to be rebuilt on first access
+    MembershipCache().invalidate_tags([f"membership:{m}" for m in memberships])
+    frappe.db.commit()
+    phases = [run_phase("cold", base_url, membership_mix, concurrency, duration)]
+    phases.append(run_phase("warm", base_url, membership_mix, concurrency, duration))
+
+    if write_interval:
+        plans = frappe.get_all("Plan", filters={"membership": ["in", memberships]}, pluck="name")
+        if plans:
+            writer = {'plans': plans, 'interval': write_interval, 'seed': seed}
+            phases.append(run_phase("writes", base_url, membership_mix, concurrency, duration, writer))
+
+    return {
+        'base_url': base_url,
+        'memberships': len(memberships),
+        'mix': mix,
+        'queries_per_request': queries,
+        'phases': phases,
+    }
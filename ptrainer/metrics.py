@@ -0,0 +1,121 @@
+from typing import Dict, List, Optional, Any, Tuple
+from contextlib import contextmanager
+import time
+import redis
+import frappe
+
+# Constants
+METRICS_KEY = "ptrainer_metrics"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 5120, 10240, 51200, 102400, 262144, 524288, 1048576, 5242880)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1)
+
+METRIC_HELP = {
+    'ptrainer_membership_requests_total': ('counter', 'get_membership calls by result'),
+    'ptrainer_membership_cache_total': ('counter', 'Membership payload cache lookups by outcome'),
+    'ptrainer_membership_errors_total': ('counter', 'Exceptions raised while building membership payloads'),
+    'ptrainer_membership_rebuild_seconds': ('histogram', 'Membership payload rebuild time by stage'),
+    'ptrainer_membership_payload_bytes': ('histogram', 'Serialized size of rebuilt membership payloads'),
+    'ptrainer_library_lookups_total': ('counter', 'Library item lookups by type and tier'),
+    'ptrainer_cache_compression_ratio': ('histogram', 'Compressed to original size of compressed cache values'),
+    'ptrainer_cache_bytes_saved_total': ('counter', 'Bytes saved by compressing cache values'),
+    'ptrainer_cache_refused_total': ('counter', 'Payloads not cached because they exceeded the size cap'),
+}
+
+def format_labels(labels: Optional[Dict[str, Any]]) -> str:
+    if not labels:
+        return ""
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+def get_buffer() -> List[Tuple[str, str, float]]:
+    """Pending (field, operation, amount) updates of the current request or job"""
+    if not hasattr(frappe.local, "ptrainer_metrics"):
+        frappe.local.ptrainer_metrics = []
+    return frappe.local.ptrainer_metrics
+
+def incr(name: str, labels: Optional[Dict[str, Any]] = None, amount: int = 1) -> None:
+    """Increment a counter"""
+    get_buffer().append((f"{name}|{format_labels(labels)}", "int", amount))
+
+def observe(name: str, value: float, labels: Optional[Dict[str, Any]] = None,
+            buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+    """Record a histogram observation"""
+    buffer = get_buffer()
+    label_string = format_labels(labels)
+    prefix = f"{label_string}," if label_string else ""
+    for bound in buckets:
+        if value <= bound:
+            buffer.append((f"{name}_bucket|{prefix}le=\"{bound}\"", "int", 1))
+    buffer.append((f"{name}_bucket|{prefix}le=\"+Inf\"", "int", 1))
+    buffer.append((f"{name}_sum|{label_string}", "float", value))
+    buffer.append((f"{name}_count|{label_string}", "int", 1))
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the wall time of a block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, labels)
+
+def flush(**kwargs) -> None:
+    """Write buffered metrics to Redis in one round trip (after_request/after_job hook)"""
+    buffer = getattr(frappe.local, "ptrainer_metrics", None)
+    if not buffer:
+        return
+    frappe.local.ptrainer_metrics = []
+
+    try:
+        cache = frappe.cache()
+        key = cache.make_key(METRICS_KEY)
+        pipeline = cache.pipeline()
+        for field, operation, amount in buffer:
+            if operation == "float":
+                pipeline.hincrbyfloat(key, field, amount)
+            else:
+                pipeline.hincrby(key, field, amount)
+        pipeline.execute()
+    except Exception:
+        frappe.log_error("Metrics Flush Error")
+
+def render_prometheus(values: Dict[str, str]) -> str:
+    """Render stored metric fields in the Prometheus text exposition format"""
+    by_metric = {}
+    for field, value in values.items():
+        series, _, labels = field.partition("|")
+        by_metric.setdefault(series, []).append((labels, value))
+
+    lines = []
+    for name, (metric_type, help_text) in METRIC_HELP.items():
+        series_names = [name] if metric_type == "counter" else [f"{name}_bucket", f"{name}_sum", f"{name}_count"]
+        if not any(series in by_metric for series in series_names):
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for series in series_names:
+            for labels, value in sorted(by_metric.get(series, [])):
+                lines.append(f"{series}{{{labels}}} {value}" if labels else f"{series} {value}")
+    return "\n".join(lines) + "\n"
+
+@frappe.whitelist()
+def get_metrics():
+    """Prometheus-compatible metrics for MembershipCache and get_membership"""
+    from werkzeug.wrappers import Response
+
+    frappe.only_for("System Manager")
+    flush()
+
+    # Bypass RedisWrapper.hgetall, which expects pickled values
+    cache = frappe.cache()
+    raw = redis.Redis.hgetall(cache, cache.make_key(METRICS_KEY)) or {}
+    values = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in raw.items()
+    }
+    return Response(render_prometheus(values), mimetype="text/plain; version=0.0.4")
+
+@frappe.whitelist()
+def reset_metrics() -> None:
+    frappe.only_for("System Manager")
+    frappe.cache().delete_value(METRICS_KEY)
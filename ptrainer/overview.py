@@ -0,0 +1,219 @@
+from typing import Dict, List, Optional, Any
+import frappe
+from frappe.utils import flt, getdate, get_datetime, now_datetime, nowdate
+from ptrainer.ptrainer_methods import MembershipCache, prefetch_library_items
+from ptrainer.ptrainer.doctype.plan.plan import get_plan_status
+
+# Constants
+OVERVIEW_CACHE_KEY = "trainer_overview"
+OVERVIEW_CACHE_TIMEOUT = 60  # seconds, doc hooks invalidate it sooner
+TREND_WINDOW_DAYS = 7  # latest week of weigh-ins compared with the week before
+
+# Plan target field -> key of nutrition_per_100g in food references
+MACRO_TARGETS = {
+    'target_proteins': 'protein',
+    'target_carbs': 'carbs',
+    'target_fats': 'fat',
+    'target_energy': 'energy',
+}
+
+def get_active_memberships() -> List[Any]:
+    """Active memberships with their client's name and status"""
+    membership = frappe.qb.DocType("Membership")
+    client = frappe.qb.DocType("Client")
+    return (
+        frappe.qb.from_(membership)
+        .join(client)
+        .on(client.name == membership.client)
+        .select(
+            membership.name.as_("membership"),
+            membership.client,
+            membership.package,
+            membership.start,
+            membership.end,
+            client.client_name,
+            client.image,
+            client.enabled,
+            client.goal,
+        )
+        .where(membership.active == 1)
+        .orderby(client.client_name)
+        .run(as_dict=True)
+    )
+
+def get_current_plans(membership_ids: List[str]) -> Dict[str, Any]:
+    """Plan covering today for each membership, or its next scheduled or latest plan"""
+    today = getdate(nowdate())
+    plans = frappe.get_all(
+        "Plan",
+        filters={"membership": ["in", membership_ids]},
+        fields=["name", "membership", "start", "end", *MACRO_TARGETS],
+        order_by="start asc"
+    )
+
+    by_membership = {}
+    for plan in plans:
+        if plan.start and plan.end:
+            by_membership.setdefault(plan.membership, []).append(plan)
+
+    current = {}
+    for membership, membership_plans in by_membership.items():
+        current[membership] = (
+            next((p for p in membership_plans if p.start <= today <= p.end), None)
+            or next((p for p in membership_plans if p.start > today), None)
+            or membership_plans[-1]
+        )
+    return current
+
+def get_weight_summaries(client_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Latest weight per client and the change between the last two weeks of weigh-ins"""
+    if not client_ids:
+        return {}
+    latest = frappe.db.sql(
+        """
+        select w.parent, w.weight, w.date
+        from `tabWeight Log` w
+        join (
+            select parent, max(date) as last_date
+            from `tabWeight Log`
+            where parenttype = 'Client' and parent in %(clients)s
+            group by parent
+        ) m on m.parent = w.parent and m.last_date = w.date
+        where w.parenttype = 'Client'
+        order by w.idx asc
+        """,
+        {"clients": tuple(client_ids)},
+        as_dict=True
+    )
+    averages = frappe.db.sql(
+        """
+        select w.parent,
+            avg(case when w.date > date_sub(m.last_date, interval %(days)s day) then w.weight end) as recent,
+            avg(case when w.date <= date_sub(m.last_date, interval %(days)s day) then w.weight end) as previous
+        from `tabWeight Log` w
+        join (
+            select parent, max(date) as last_date
+            from `tabWeight Log`
+            where parenttype = 'Client' and parent in %(clients)s
+            group by parent
+        ) m on m.parent = w.parent
+        where w.parenttype = 'Client' and w.date > date_sub(m.last_date, interval %(window)s day)
+        group by w.parent
+        """,
+        {"clients": tuple(client_ids), "days": TREND_WINDOW_DAYS, "window": TREND_WINDOW_DAYS * 2},
+        as_dict=True
+    )
+
+    summaries = {row.parent: {'weight': row.weight, 'date': row.date, 'trend': None} for row in latest}
+    for row in averages:
+        if row.parent in summaries and row.recent is not None and row.previous is not None:
+            summaries[row.parent]['trend'] = round(flt(row.recent) - flt(row.previous), 2)
+    return summaries
+
+def get_last_performance_dates(client_ids: List[str]) -> Dict[str, Any]:
+    return {
+        row.parent: row.last_date
+        for row in frappe.get_all(
+            "Performance Log",
+            filters={"parenttype": "Client", "parent": ["in", client_ids or [""]]},
+            fields=["parent", "max(date) as last_date"],
+            group_by="parent"
+        )
+    }
+
+def get_planned_macros(plan_names: List[str]) -> Dict[str, Dict[str, float]]:
+    """Average planned daily macros per plan, over days that have foods"""
+    rows = frappe.get_all(
+        "Foods",
+        filters={"parenttype": "Plan", "parent": ["in", plan_names or [""]]},
+        fields=["parent", "parentfield", "food", "sum(amount) as amount"],
+        group_by="parent, parentfield, food"
+    )
+    if not rows:
+        return {}
+
+    cache = MembershipCache()
+    prefetch_library_items(set(), {row.food for row in rows})
+
+    day_totals: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for row in rows:
+        reference = cache.get_cached_library_item("Food", row.food) or {}
+        nutrition = reference.get('nutrition_per_100g') or {}
+        totals = day_totals.setdefault(row.parent, {}).setdefault(
+            row.parentfield, {macro: 0.0 for macro in MACRO_TARGETS.values()}
+        )
+        for macro in totals:
+            if macro in nutrition:
+                totals[macro] += nutrition[macro]['value'] * flt(row.amount) / 100
+
+    return {
+        plan: {
+            macro: round(sum(day[macro] for day in days.values()) / len(days), 1)
+            for macro in MACRO_TARGETS.values()
+        }
+        for plan, days in day_totals.items()
+    }
+
+def build_trainer_overview() -> Dict[str, Any]:
+    """Roster of active clients built from a handful of grouped queries"""
+    memberships = get_active_memberships()
+    membership_ids = [m.membership for m in memberships]
+    client_ids = list({m.client for m in memberships})
+
+    plans = get_current_plans(membership_ids) if membership_ids else {}
+    weights = get_weight_summaries(client_ids)
+    performance = get_last_performance_dates(client_ids)
+    planned = get_planned_macros([plan.name for plan in plans.values()])
+
+    now = now_datetime()
+    today = getdate(nowdate())
+    roster = []
+    for membership in memberships:
+        plan = plans.get(membership.membership)
+        weight = weights.get(membership.client) or {}
+        roster.append({
+            'membership': membership.membership,
+            'client': membership.client,
+            'client_name': membership.client_name,
+            'image': membership.image,
+            'enabled': membership.enabled,
+            'goal': membership.goal,
+            'package': membership.package,
+            'days_left': max((get_datetime(membership.end) - now).days, 0) if membership.end else None,
+            'plan': plan.name if plan else None,
+            'plan_status': get_plan_status(plan.start, plan.end, today) if plan else None,
+            'latest_weight': weight.get('weight'),
+            'weight_date': weight.get('date'),
+            'weight_trend': weight.get('trend'),
+            'last_performance_log': performance.get(membership.client),
+            'macros': {
+                macro: {
+                    'target': flt(plan.get(target_field)) if plan else None,
+                    'planned': planned.get(plan.name, {}).get(macro) if plan else None,
+                }
+                for target_field, macro in MACRO_TARGETS.items()
+            },
+        })
+
+    return {
+        'generated': now,
+        'clients': roster,
+        'summary': {
+            'active_memberships': len(roster),
+            'without_plan': sum(1 for row in roster if not row['plan']),
+            'ending_this_week': sum(1 for row in roster if row['days_left'] is not None and row['days_left'] <= 7),
+        }
+    }
+
+@frappe.whitelist()
+def get_trainer_overview() -> Dict[str, Any]:
+    """Roster view of every active client, cached for a short time"""
+    frappe.has_permission("Membership", "read", throw=True)
+    overview = frappe.cache().get_value(OVERVIEW_CACHE_KEY)
+    if overview is None:
+        overview = build_trainer_overview()
+        frappe.cache().set_value(OVERVIEW_CACHE_KEY, overview, expires_in_sec=OVERVIEW_CACHE_TIMEOUT)
+    return overview
+
+def invalidate_trainer_overview() -> None:
+    frappe.cache().delete_value(OVERVIEW_CACHE_KEY)
@@ -0,0 +1,358 @@
+from typing import Dict, List, Optional, Any, Iterable
+from array import array
+from bisect import bisect_right
+from datetime import date
+import json
+import frappe
+from frappe.utils import getdate, cint, flt
+
+# Constants
+TREND_SESSIONS = 8  # sessions used for the volume trend slope
+PROGRESSION_DEFAULTS = {
+    'progression_model': 'Double Progression',
+    'progression_increment': 2.5,
+    'progression_rep_range': 4,
+    'progression_deload': 10
+}
+
+def get_performance_series_key(client_id: str) -> str:
+    """Redis hash holding one series per exercise for a client"""
+    return f"performance_series:{client_id}"
+
+def new_series() -> Dict[str, Any]:
+    """Empty columnar series: one set per index, sorted by date"""
+    return {
+        'dates': array('i'),  # date ordinals
+        'weights': array('d'),
+        'reps': array('i'),
+        'session_dates': array('i'),
+        'session_volumes': array('d'),
+        'summary': None
+    }
+
+def estimate_1rm(weight: float, reps: int) -> float:
+    """Epley estimated one-rep max"""
+    if reps <= 1:
+        return weight
+    return weight * (1 + reps / 30)
+
+def volume_slope(volumes: Iterable[float]) -> float:
+    """Least-squares slope of session volume over session index"""
+    volumes = list(volumes)
+    n = len(volumes)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(volumes) / n
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(volumes))
+    denominator = sum((x - mean_x) ** 2 for x in range(n))
+    return numerator / denominator
+
+def summarize_series(series: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Compute PRs, estimated 1RM, volume trend and last session from the columns"""
+    dates, weights, reps = series['dates'], series['weights'], series['reps']
+    if not dates:
+        return None
+
+    e1rms = list(map(estimate_1rm, weights, reps))
+    best_e1rm_index = max(range(len(e1rms)), key=e1rms.__getitem__)
+    best_weight_index = max(range(len(weights)), key=weights.__getitem__)
+
+    last_date = dates[-1]
+    last_start = bisect_right(dates, last_date - 1)
+    last_weights = weights[last_start:]
+    last_reps = reps[last_start:]
+
+    session_volumes = series['session_volumes']
+    return {
+        'e1rm': round(max(e1rms[last_start:]), 1),
+        'records': {
+            'e1rm': {'value': round(e1rms[best_e1rm_index], 1), 'date': date.fromordinal(dates[best_e1rm_index])},
+            'weight': {'value': weights[best_weight_index], 'reps': reps[best_weight_index],
+                       'date': date.fromordinal(dates[best_weight_index])},
+            'reps': max(reps),
+            'volume': round(max(session_volumes), 1)
+        },
+        'trend': round(volume_slope(session_volumes[-TREND_SESSIONS:]), 1),
+        'last_session': {
+            'date': date.fromordinal(last_date),
+            'sets': len(last_weights),
+            'top_weight': max(last_weights),
+            'top_weight_reps': min(r for w, r in zip(last_weights, last_reps) if w == max(last_weights)),
+            'reps': sum(last_reps),
+            'volume': round(sum(map(lambda w, r: w * r, last_weights, last_reps)), 1)
+        },
+        'sessions': len(session_volumes)
+    }
+
+def rebuild_sessions(series: Dict[str, Any]) -> None:
+    """Recompute per-date session volume from the set columns"""
+    series['session_dates'] = array('i')
+    series['session_volumes'] = array('d')
+    for day, weight, reps in zip(series['dates'], series['weights'], series['reps']):
+        if series['session_dates'] and series['session_dates'][-1] == day:
+            series['session_volumes'][-1] += weight * reps
+        else:
+            series['session_dates'].append(day)
+            series['session_volumes'].append(weight * reps)
+
+def append_set(series: Dict[str, Any], log_date: Any, weight: Any, reps: Any) -> None:
+    """Append one logged set, keeping the columns sorted by date"""
+    day = getdate(log_date).toordinal()
+    weight = float(weight or 0)
+    reps = int(reps or 0)
+
+    if not series['dates'] or day >= series['dates'][-1]:
+        series['dates'].append(day)
+        series['weights'].append(weight)
+        series['reps'].append(reps)
+        if series['session_dates'] and series['session_dates'][-1] == day:
+            series['session_volumes'][-1] += weight * reps
+        else:
+            series['session_dates'].append(day)
+            series['session_volumes'].append(weight * reps)
+    else:
+        # Back-dated entry
+        position = bisect_right(series['dates'], day)
+        series['dates'].insert(position, day)
+        series['weights'].insert(position, weight)
+        series['reps'].insert(position, reps)
+        rebuild_sessions(series)
+
+def build_performance_series(performance_rows: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    """Build a series per exercise from Performance Log rows"""
+    performance = {}
+    for row in sorted(performance_rows, key=lambda r: getdate(r.date)):
+        if not row.exercise or not row.date:
+            continue
+        series = performance.setdefault(row.exercise, new_series())
+        append_set(series, row.date, row.weight, row.reps)
+
+    for series in performance.values():
+        series['summary'] = summarize_series(series)
+    return performance
+
+def series_for_response(series: Dict[str, Any]) -> Dict[str, Any]:
+    """Columnar, JSON-friendly view of a series"""
+    return {
+        'date': [date.fromordinal(d) for d in series['dates']],
+        'weight': list(series['weights']),
+        'reps': list(series['reps']),
+        'summary': series['summary']
+    }
+
+def load_client_performance_rows(client_id: str, exercises: Optional[List[str]] = None) -> List[Any]:
+    filters = {"parenttype": "Client", "parent": client_id}
+    if exercises is not None:
+        filters["exercise"] = ["in", exercises]
+    return frappe.get_all(
+        "Performance Log",
+        filters=filters,
+        fields=["exercise", "weight", "reps", "date"],
+        order_by="date asc, idx asc"
+    )
+
+def get_performance_series(client_id: str, exercises: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Get the stored series for a client's exercises, building missing ones in one query"""
+    cache = frappe.cache()
+    key = get_performance_series_key(client_id)
+    exercises = list(set(exercises))
+
+    result = {}
+    missing = []
+    for exercise in exercises:
+        series = cache.hget(key, exercise)
+        if series is None:
+            missing.append(exercise)
+        elif series:
+            result[exercise] = series
+
+    if missing:
+        built = build_performance_series(load_client_performance_rows(client_id, missing))
+        for exercise in missing:
+            # Store empty markers too so exercises without logs don't hit the DB again
+            cache.hset(key, exercise, built.get(exercise, {}))
+        result.update(built)
+
+    return result
+
+def update_performance_series(client_doc: Any) -> None:
+    """Apply Performance Log changes of a saved client to the stored series"""
+    cache = frappe.cache()
+    key = get_performance_series_key(client_doc.name)
+
+    before = client_doc.get_doc_before_save()
+    old_rows = {row.name: row for row in (before.get('exercise_performance') or [])} if before else None
+    if old_rows is None:
+        cache.delete_value(key)
+        return
+
+    def row_key(row):
+        return (row.exercise, row.weight, row.reps, str(row.date))
+
+    new_rows = {row.name: row for row in client_doc.get('exercise_performance') or []}
+    appended = [row for name, row in new_rows.items() if name not in old_rows]
+    changed_exercises = {
+        row.exercise for name, row in old_rows.items()
+        if name not in new_rows or row_key(row) != row_key(new_rows[name])
+    } | {
+        row.exercise for name, row in new_rows.items()
+        if name in old_rows and row_key(row) != row_key(old_rows[name])
+    }
+
+    # Edited or removed rows: rebuild those exercises from the saved rows
+    if changed_exercises:
+        rebuilt = build_performance_series(
+            row for row in new_rows.values() if row.exercise in changed_exercises
+        )
+        for exercise in changed_exercises:
+            cache.hset(key, exercise, rebuilt.get(exercise, {}))
+
+    # New rows: append to the stored columns
+    appended_by_exercise = {}
+    for row in appended:
+        if row.exercise and row.date and row.exercise not in changed_exercises:
+            appended_by_exercise.setdefault(row.exercise, []).append(row)
+
+    for exercise, rows in appended_by_exercise.items():
+        series = cache.hget(key, exercise)
+        if series is None:
+            # Not built yet, it will be built from the database on first read
+            continue
+        series = series or new_series()
+        for row in sorted(rows, key=lambda r: getdate(r.date)):
+            append_set(series, row.date, row.weight, row.reps)
+        series['summary'] = summarize_series(series)
+        cache.hset(key, exercise, series)
+
+def invalidate_performance_series(client_id: str) -> None:
+    frappe.cache().delete_value(get_performance_series_key(client_id))
+
+@frappe.whitelist()
+def get_exercise_progress(client: str, exercise: Optional[str] = None) -> Dict[str, Any]:
+    """Progress summary (e1RM, records, trend, last session) for a client's exercises"""
+    frappe.has_permission("Client", "read", client, throw=True)
+    if exercise:
+        exercises = [exercise]
+    else:
+        exercises = list({
+            row.exercise for row in frappe.get_all(
+                "Performance Log",
+                filters={"parenttype": "Client", "parent": client},
+                fields=["exercise"],
+                distinct=True
+            )
+        })
+
+    series = get_performance_series(client, exercises)
+    return {name: s['summary'] for name, s in series.items()}
+
+def get_progression_settings() -> Dict[str, Any]:
+    """Progression model configuration from Ptrainer Settings"""
+    settings = frappe.get_cached_doc("Ptrainer Settings")
+    return {key: settings.get(key) or default for key, default in PROGRESSION_DEFAULTS.items()}
+
+def suggest_progression(summary: Optional[Dict[str, Any]], target_reps: Any, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Next target weight and reps for an exercise from its performance summary
+    Args:
+        summary (dict): Summary of the client's series for the exercise
+        target_reps (int): Reps planned for the exercise
+        settings (dict): Progression settings
+    Returns:
+        dict: Suggested weight, reps and the reason, or None without history
+    """
+    if not summary:
+        return None
+
+    target_reps = cint(target_reps) or 1
+    increment = flt(settings['progression_increment'])
+    last = summary['last_session']
+    weight = last['top_weight']
+    achieved = last.get('top_weight_reps', last['reps'] // max(last['sets'], 1))
+
+    # Well below the client's best: back off
+    if summary['e1rm'] < summary['records']['e1rm']['value'] * (1 - flt(settings['progression_deload']) / 100):
+        deloaded = weight * (1 - flt(settings['progression_deload']) / 100)
+        return {'weight': round_to_increment(deloaded, increment), 'reps': target_reps, 'basis': 'deload'}
+
+    if settings['progression_model'] == 'Linear':
+        if achieved >= target_reps:
+            return {'weight': round_to_increment(weight + increment, increment), 'reps': target_reps, 'basis': 'increase_weight'}
+        return {'weight': weight, 'reps': target_reps, 'basis': 'repeat'}
+
+    # Double progression: climb the rep range, then add weight and start over
+    top_reps = target_reps + cint(settings['progression_rep_range'])
+    if achieved >= top_reps:
+        return {'weight': round_to_increment(weight + increment, increment), 'reps': target_reps, 'basis': 'increase_weight'}
+    return {'weight': weight, 'reps': max(achieved + 1, target_reps), 'basis': 'increase_reps'}
+
+def round_to_increment(weight: float, increment: float) -> float:
+    if increment <= 0:
+        return round(weight, 1)
+    return round(round(weight / increment) * increment, 2)
+
+def get_progression_suggestions(items: Iterable[tuple]) -> Dict[str, Dict[str, Any]]:
+    """
+    Suggestions for many client exercises in one pass over the stored series
+    Args:
+        items: (client, exercise, target_reps) tuples
+    Returns:
+        dict: client -> exercise -> suggestion
+    """
+    settings = get_progression_settings()
+
+    by_client = {}
+    for client_id, exercise, target_reps in items:
+        if client_id and exercise:
+            by_client.setdefault(client_id, {}).setdefault(exercise, target_reps)
+
+    suggestions = {}
+    for client_id, targets in by_client.items():
+        series = get_performance_series(client_id, targets)
+        client_suggestions = {}
+        for exercise, target_reps in targets.items():
+            if exercise in series:
+                suggestion = suggest_progression(series[exercise]['summary'], target_reps, settings)
+                if suggestion:
+                    client_suggestions[exercise] = suggestion
+        suggestions[client_id] = client_suggestions
+
+    return suggestions
+
+@frappe.whitelist()
+def get_plan_suggestions(plans: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Progressive-overload suggestions for the exercises of one or more plans
+    Args:
+        plans (list|str): Plan names (a single name is accepted too)
+    Returns:
+        dict: plan -> exercise -> suggestion
+    """
+    if isinstance(plans, str):
+        plans = json.loads(plans) if plans.startswith("[") else [plans]
+    for plan in plans:
+        frappe.has_permission("Plan", "read", plan, throw=True)
+
+    plan_clients = {
+        plan.name: plan.client
+        for plan in frappe.get_all("Plan", filters={"name": ["in", plans]}, fields=["name", "client"])
+    }
+    rows = frappe.get_all(
+        "Exercises",
+        filters={"parenttype": "Plan", "parent": ["in", list(plan_clients) or [""]]},
+        fields=["parent", "exercise", "reps"],
+        order_by="parent asc, idx asc"
+    )
+
+    suggestions = get_progression_suggestions(
+        (plan_clients[row.parent], row.exercise, row.reps) for row in rows
+    )
+
+    result = {plan: {} for plan in plan_clients}
+    for row in rows:
+        client_suggestions = suggestions.get(plan_clients[row.parent], {})
+        if row.exercise in client_suggestions:
+            result[row.parent][row.exercise] = client_suggestions[row.exercise]
+    return result
+
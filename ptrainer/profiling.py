@@ -0,0 +1,145 @@
+from typing import Dict, List, Optional, Any
+from contextlib import contextmanager
+import random
+import time
+import frappe
+from frappe.utils import cint, flt
+
+# Constants
+PROFILE_HEADER = "X-Ptrainer-Profile"
+PROFILE_ROLE = "System Manager"
+
+_redis_patched = False
+
+class Profiler:
+    """Wall time, SQL queries and Redis calls per stage of one profiled call"""
+
+    def __init__(self, method: str, reference: Optional[str] = None, trigger: str = "Sampled"):
+        self.method = method
+        self.reference = reference
+        self.trigger = trigger
+        self.stack: List[str] = []
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.started = time.perf_counter()
+
+    def get_stage(self, name: str) -> Dict[str, float]:
+        return self.stages.setdefault(name, {'seconds': 0.0, 'queries': 0, 'query_seconds': 0.0, 'redis_calls': 0})
+
+    def current(self) -> Dict[str, float]:
+        """Innermost open stage, queries and Redis calls are attributed to it"""
+        return self.get_stage("/".join(self.stack) or "other")
+
+    def as_log(self) -> Dict[str, Any]:
+        stages = [
+            {
+                'stage': name,
+                'duration': round(values['seconds'] * 1000, 3),
+                'queries': values['queries'],
+                'query_duration': round(values['query_seconds'] * 1000, 3),
+                'redis_calls': values['redis_calls'],
+            }
+            for name, values in self.stages.items()
+        ]
+        return {
+            'method': self.method,
+            'reference': self.reference,
+            'trigger': self.trigger,
+            'user': frappe.session.user,
+            'duration': round((time.perf_counter() - self.started) * 1000, 3),
+            'queries': sum(s['queries'] for s in stages),
+            'query_duration': round(sum(s['query_duration'] for s in stages), 3),
+            'redis_calls': sum(s['redis_calls'] for s in stages),
+            'stages': stages,
+        }
+
+def get_profiler() -> Optional[Profiler]:
+    return getattr(frappe.local, "ptrainer_profiler", None)
+
+def get_profile_trigger() -> Optional[str]:
+    """Header for admins, otherwise a random sample at the configured rate"""
+    request = getattr(frappe.local, "request", None)
+    if request and request.headers.get(PROFILE_HEADER) and PROFILE_ROLE in frappe.get_roles():
+        return "Header"
+
+    settings = frappe.get_cached_doc("Ptrainer Settings")
+    if cint(settings.profiling_enabled):
+        if random.random() * 100 < flt(settings.profiling_sample_rate):
+            return "Sampled"
+    return None
+
+def patch_redis() -> None:
+    """Count Redis commands of the profiled request, the client is shared between threads"""
+    global _redis_patched
+    if _redis_patched:
+        return
+    cache = frappe.cache()
+    execute_command = cache.execute_command
+
+    def counting_execute_command(*args, **kwargs):
+        profiler = get_profiler()
+        if profiler:
+            profiler.current()['redis_calls'] += 1
+        return execute_command(*args, **kwargs)
+
+    cache.execute_command = counting_execute_command
+    _redis_patched = True
+
+@contextmanager
+def profile(method: str, reference: Optional[str] = None):
+    """
+    Profile a call when sampled or requested, saving the result to a Profile Log in the background
+    Args:
+        method (str): Profiled function
+        reference (str): Document the call was for
+    """
+    trigger = None if get_profiler() else get_profile_trigger()
+    if not trigger:
+        yield
+        return
+
+    profiler = Profiler(method, reference, trigger)
+    patch_redis()
+    sql = frappe.db.sql
+
+    def timed_sql(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return sql(*args, **kwargs)
+        finally:
+            stage = profiler.current()
+            stage['queries'] += 1
+            stage['query_seconds'] += time.perf_counter() - started
+
+    frappe.local.ptrainer_profiler = profiler
+    frappe.db.sql = timed_sql
+    try:
+        yield
+    finally:
+        frappe.db.sql = sql
+        frappe.local.ptrainer_profiler = None
+        frappe.enqueue("ptrainer.profiling.save_profile", queue="short", profile=profiler.as_log())
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the profiled call, nested stages are named parent/child"""
+    profiler = get_profiler()
+    if not profiler:
+        yield
+        return
+
+    profiler.stack.append(name)
+    path = "/".join(profiler.stack)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.stack.pop()
+        profiler.get_stage(path)['seconds'] += time.perf_counter() - started
+
+def save_profile(profile: Dict[str, Any]) -> None:
+    """Background job storing a profile"""
+    stages = profile.pop('stages')
+    log = frappe.get_doc({"doctype": "Profile Log", **profile})
+    for row in stages:
+        log.append("stages", row)
+    log.insert(ignore_permissions=True)
@@ -1,69 +1,176 @@
 # Copyright (c) 2024, YZ and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import cint, flt, getdate
+
+
+# Client fields the target formula reads
+TARGET_INPUT_FIELDS = ('gender', 'goal', 'height', 'age', 'activity_level', 'factor')
+TARGET_FIELDS = ('target_energy', 'target_proteins', 'target_carbs', 'target_fats', 'target_water')
+TARGET_OUTPUT_FIELDS = ('bmi', 'bmr', 'tdee', *TARGET_FIELDS)
+
+# Ptrainer Settings fields the target formula reads
+TARGET_SETTINGS_FIELDS = (
+    'default_height', 'default_weight', 'default_gender', 'default_goal', 'default_age',
+    'activity_factor_sedentary', 'activity_factor_light', 'activity_factor_moderate',
+    'activity_factor_very', 'activity_factor_extra',
+    'bmr_weight_multiplier', 'bmr_height_multiplier', 'bmr_age_multiplier',
+    'bmr_male_constant', 'bmr_female_constant',
+    'weight_loss_calorie_deficit', 'muscle_gain_calorie_surplus', 'weight_gain_calorie_surplus',
+    'protein_multiplier_loss', 'carb_multiplier_loss', 'fat_multiplier_loss',
+    'protein_multiplier_building', 'carb_multiplier_building', 'fat_multiplier_building',
+    'protein_multiplier_gain', 'carb_multiplier_gain', 'fat_multiplier_gain',
+    'protein_multiplier_maintenance', 'carb_multiplier_maintenance', 'fat_multiplier_maintenance',
+    'protein_calories_per_gram', 'fat_calories_per_gram', 'carb_calories_per_gram',
+    'water_multiplier', 'water_bonus_very_active', 'water_bonus_extra_active',
+    'water_bonus_moderate', 'water_bonus_light'
+)
 
 
 class Client(Document):
     def calculate_targets(self):
         settings = frappe.get_single("Ptrainer Settings")
+        latest = get_latest_weight_row(self.weight)
 
-        # Default fallback values if settings are empty
-        defaults = {
-            'height': 175,
-            'weight': 80,
-            'gender': 'Male',
-            'goal': 'Weight Loss',
-            'age': 30,
-            'activity_factor_sedentary': 1.2,
-            'activity_factor_light': 1.375,
-            'activity_factor_moderate': 1.55,
-            'activity_factor_very': 1.725,
-            'activity_factor_extra': 1.9
-        }
+        columns = {field: [self.get(field)] for field in TARGET_INPUT_FIELDS}
+        columns['weight'] = [latest.weight if latest else None]
 
-        # Get client values or defaults
-        gender = self.gender if self.gender else settings.default_gender or defaults[
-            'gender']
-        goal = self.goal if self.goal else settings.default_goal or defaults['goal']
-        height = self.height if self.height else settings.default_height or defaults[
-            'height']
-        weight = self.weight[-1].weight if self.weight else settings.default_weight or defaults['weight']
-        age = self.age if self.age else settings.default_age or defaults['age']
+        # Store results
+        results = calculate_targets_batch(columns, get_target_parameters(settings))
+        for field in TARGET_OUTPUT_FIELDS:
+            self.set(field, results[field][0])
 
+    def validate(self):
+        # Default image based on gender
+        if not self.image:
+            if self.gender == "Male":
+                self.image = '/assets/ptrainer/images/male_default.png'
+            elif self.gender == "Female":
+                self.image = '/assets/ptrainer/images/female_default.png'
+
+        # Calculate age based on date_of_birth
+        if self.date_of_birth:
+            self.age = frappe.utils.getdate().year - frappe.utils.getdate(self.date_of_birth).year
+            if (frappe.utils.getdate().month, frappe.utils.getdate().day) < (frappe.utils.getdate(self.date_of_birth).month, frappe.utils.getdate(self.date_of_birth).day):
+                self.age -= 1
+
+        # Call the target calculation
+        if not self.adjust:
+            self.calculate_targets()
+
+        if self.referred_by and self.referred_by == self.name:
+            frappe.throw("You cannot refer yourself. Please choose another user.")
+
+def get_client_summary(client_id, fields=None):
+    """
+    Fetch a client's scalar fields without loading the weight and
+    exercise_performance child tables, which grow with every log.
+    """
+    return frappe.db.get_value(
+        "Client",
+        client_id,
+        fields or frappe.get_meta("Client").get_valid_columns(),
+        as_dict=True
+    )
+
+def get_client_summaries(client_ids, fields=None):
+    """Scalar fields of many clients in one query, keyed by client name"""
+    fields = list(fields or frappe.get_meta("Client").get_valid_columns())
+    if "name" not in fields:
+        fields.append("name")
+    return {
+        client.name: client
+        for client in frappe.get_all(
+            "Client",
+            filters={"name": ["in", list(set(client_ids)) or [""]]},
+            fields=fields
+        )
+    }
+
+@frappe.whitelist()
+def get_weight_logs(client, start=0, page_length=100):
+    """Page through a client's weight logs, newest first"""
+    frappe.has_permission("Client", "read", client, throw=True)
+    return frappe.get_all(
+        "Weight Log",
+        filters={"parenttype": "Client", "parent": client},
+        fields=["name", "weight", "date"],
+        order_by="date desc, idx desc",
+        start=cint(start),
+        page_length=cint(page_length)
+    )
+
+@frappe.whitelist()
+def get_performance_logs(client, exercise=None, start=0, page_length=100):
+    """Page through a client's performance logs, newest first"""
+    frappe.has_permission("Client", "read", client, throw=True)
+    filters = {"parenttype": "Client", "parent": client}
+    if exercise:
+        filters["exercise"] = exercise
+    return frappe.get_all(
+        "Performance Log",
+        filters=filters,
+        fields=["name", "exercise", "weight", "reps", "date"],
+        order_by="date desc, idx desc",
+        start=cint(start),
+        page_length=cint(page_length)
+    )
+
+def get_latest_weight_row(weight_rows):
+    """Most recent weigh-in by date (insertion order breaks ties)"""
+    latest = None
+    for row in weight_rows or []:
+        if latest is None or not latest.date or (row.date and getdate(row.date) >= getdate(latest.date)):
+            latest = row
+    return latest
+
+def get_target_parameters(settings):
+    """Resolve Ptrainer Settings into the parameters of the target formula"""
+    # Default fallback values if settings are empty
+    defaults = {
+        'height': 175,
+        'weight': 80,
+        'gender': 'Male',
+        'goal': 'Weight Loss',
+        'age': 30,
+        'activity_factor_sedentary': 1.2,
+        'activity_factor_light': 1.375,
+        'activity_factor_moderate': 1.55,
+        'activity_factor_very': 1.725,
+        'activity_factor_extra': 1.9
+    }
+
+    return {
+        'defaults': {
+            'gender': settings.default_gender or defaults['gender'],
+            'goal': settings.default_goal or defaults['goal'],
+            'height': settings.default_height or defaults['height'],
+            'weight': settings.default_weight or defaults['weight'],
+            'age': settings.default_age or defaults['age'],
+        },
         # Get activity factor based on activity level
-        activity_factors = {
+        'activity_factors': {
             'Sedentary': settings.activity_factor_sedentary or defaults['activity_factor_sedentary'],
             'Light': settings.activity_factor_light or defaults['activity_factor_light'],
             'Moderate': settings.activity_factor_moderate or defaults['activity_factor_moderate'],
             'Very Active': settings.activity_factor_very or defaults['activity_factor_very'],
             'Extra Active': settings.activity_factor_extra or defaults['activity_factor_extra']
-        }
-        activity_factor = activity_factors.get(
-            self.activity_level, defaults['activity_factor_sedentary'])
-
-        # Calculate BMI
-        height_in_meters = height / 100
-        bmi = weight / (height_in_meters ** 2)
-
-        # Calculate BMR using Mifflin-St Jeor Equation
-        if gender == 'Male':
-            bmr = (settings.bmr_weight_multiplier or 10) * weight + \
-                  (settings.bmr_height_multiplier or 6.25) * height - \
-                  (settings.bmr_age_multiplier or 5) * age + \
-                  (settings.bmr_male_constant or 5)
-        else:  # Female
-            bmr = (settings.bmr_weight_multiplier or 10) * weight + \
-                  (settings.bmr_height_multiplier or 6.25) * height - \
-                  (settings.bmr_age_multiplier or 5) * age - \
-                  (settings.bmr_female_constant or 161)
-
-        # Calculate TDEE
-        tdee = bmr * activity_factor
-
+        },
+        'default_activity_factor': defaults['activity_factor_sedentary'],
+        'bmr': {
+            'weight': settings.bmr_weight_multiplier or 10,
+            'height': settings.bmr_height_multiplier or 6.25,
+            'age': settings.bmr_age_multiplier or 5,
+            'male': settings.bmr_male_constant or 5,
+            'female': settings.bmr_female_constant or 161
+        },
         # Get goal-based multipliers and adjustments
-        goal_adjustments = {
+        'goal_adjustments': {
             'Weight Loss': {
                 'calorie_adjustment': settings.weight_loss_calorie_deficit or -500,
                 'protein_multiplier': settings.protein_multiplier_loss or 2.2,
@@ -88,63 +195,218 @@ class Client(Document):
                 'carb_multiplier': settings.carb_multiplier_maintenance or 3.5,
                 'fat_multiplier': settings.fat_multiplier_maintenance or 0.9
             }
-        }
-
-        # Apply goal-specific adjustments
-        adjustments = goal_adjustments.get(
-            goal, goal_adjustments['Maintenance'])
-        target_calories = tdee + adjustments['calorie_adjustment']
-
-        # Calculate macronutrients
-        proteins = weight * adjustments['protein_multiplier']
-        fats = weight * adjustments['fat_multiplier']
-
-        # Calculate remaining calories for carbs
-        protein_calories = proteins * (settings.protein_calories_per_gram or 4)
-        fat_calories = fats * (settings.fat_calories_per_gram or 9)
-        remaining_calories = target_calories - protein_calories - fat_calories
-        carbs = remaining_calories / (settings.carb_calories_per_gram or 4)
-
-        # Water calculation
-        base_water = weight * (settings.water_multiplier or 35)
-        activity_water_adjustments = {
+        },
+        'calories_per_gram': {
+            'protein': settings.protein_calories_per_gram or 4,
+            'fat': settings.fat_calories_per_gram or 9,
+            'carb': settings.carb_calories_per_gram or 4
+        },
+        'water_multiplier': settings.water_multiplier or 35,
+        'water_bonus': {
             'Very Active': settings.water_bonus_very_active or 500,
             'Extra Active': settings.water_bonus_extra_active or 750,
             'Moderate': settings.water_bonus_moderate or 250,
             'Light': settings.water_bonus_light or 0,
             'Sedentary': 0
         }
-        water = base_water + \
-            activity_water_adjustments.get(self.activity_level, 0)
+    }
 
-        # Store results
-        self.bmi = round(bmi, 1)
-        self.bmr = round(bmr)
-        self.tdee = round(tdee)
-        adjustment_factor = self.factor if self.factor and self.factor > 0 else 1.0
-        self.target_energy = round(target_calories * adjustment_factor)
-        self.target_proteins = round(proteins * adjustment_factor)
-        self.target_carbs = round(carbs * adjustment_factor)
-        self.target_fats = round(fats * adjustment_factor)
-        self.target_water = round(water * adjustment_factor)
+def calculate_targets_batch(columns, params):
+    """
+    Mifflin-St Jeor BMR, TDEE, macro and water targets for many clients at once
+    Args:
+        columns (dict): Equal-length lists for gender, goal, height, weight, age, activity_level and factor
+        params (dict): Parameters from get_target_parameters
+    Returns:
+        dict: Equal-length lists for bmi, bmr, tdee and the target_* fields
+    """
+    defaults = params['defaults']
+    bmr_params = params['bmr']
+    kcal = params['calories_per_gram']
 
-    def validate(self):
-        # Default image based on gender
-        if not self.image:
-            if self.gender == "Male":
-                self.image = '/assets/ptrainer/images/male_default.png'
-            elif self.gender == "Female":
-                self.image = '/assets/ptrainer/images/female_default.png'
+    # Get client values or defaults
+    gender = [g or defaults['gender'] for g in columns['gender']]
+    goal = [g or defaults['goal'] for g in columns['goal']]
+    height = [flt(h) or flt(defaults['height']) for h in columns['height']]
+    weight = [flt(w) or flt(defaults['weight']) for w in columns['weight']]
+    age = [flt(a) or flt(defaults['age']) for a in columns['age']]
+    activity = columns['activity_level']
+    factor = [flt(f) if f and flt(f) > 0 else 1.0 for f in columns['factor']]
 
-        # Calculate age based on date_of_birth
-        if self.date_of_birth:
-            self.age = frappe.utils.getdate().year - frappe.utils.getdate(self.date_of_birth).year
-            if (frappe.utils.getdate().month, frappe.utils.getdate().day) < (frappe.utils.getdate(self.date_of_birth).month, frappe.utils.getdate(self.date_of_birth).day):
-                self.age -= 1
+    activity_factor = [params['activity_factors'].get(a, params['default_activity_factor']) for a in activity]
+    adjustments = [
+        params['goal_adjustments'].get(g, params['goal_adjustments']['Maintenance']) for g in goal
+    ]
 
-        # Call the target calculation
-        if not self.adjust:
-            self.calculate_targets()
+    # Calculate BMI
+    bmi = [w / ((h / 100) ** 2) for w, h in zip(weight, height)]
 
-        if self.referred_by and self.referred_by == self.name:
-            frappe.throw("You cannot refer yourself. Please choose another user.")
+    # Calculate BMR using Mifflin-St Jeor Equation
+    bmr = [
+        bmr_params['weight'] * w + bmr_params['height'] * h - bmr_params['age'] * a
+        + (bmr_params['male'] if g == 'Male' else -bmr_params['female'])
+        for w, h, a, g in zip(weight, height, age, gender)
+    ]
+
+    # Calculate TDEE and apply goal-specific adjustments
+    tdee = [b * f for b, f in zip(bmr, activity_factor)]
+    target_calories = [t + adj['calorie_adjustment'] for t, adj in zip(tdee, adjustments)]
+
+    # Calculate macronutrients, carbs fill the remaining calories
+    proteins = [w * adj['protein_multiplier'] for w, adj in zip(weight, adjustments)]
+    fats = [w * adj['fat_multiplier'] for w, adj in zip(weight, adjustments)]
+    carbs = [
+        (c - p * kcal['protein'] - f * kcal['fat']) / kcal['carb']
+        for c, p, f in zip(target_calories, proteins, fats)
+    ]
+
+    # Water calculation
+    water = [
+        w * params['water_multiplier'] + params['water_bonus'].get(a, 0)
+        for w, a in zip(weight, activity)
+    ]
+
+    return {
+        'bmi': [round(v, 1) for v in bmi],
+        'bmr': [round(v) for v in bmr],
+        'tdee': [round(v) for v in tdee],
+        'target_energy': [round(v * f) for v, f in zip(target_calories, factor)],
+        'target_proteins': [round(v * f) for v, f in zip(proteins, factor)],
+        'target_carbs': [round(v * f) for v, f in zip(carbs, factor)],
+        'target_fats': [round(v * f) for v, f in zip(fats, factor)],
+        'target_water': [round(v * f) for v, f in zip(water, factor)],
+    }
+
+def load_target_inputs(client_ids=None):
+    """Target formula inputs for all non-adjusted clients (or the given ones) as columns"""
+    filters = {"adjust": 0}
+    if client_ids:
+        filters["name"] = ["in", client_ids]
+
+    clients = frappe.get_all(
+        "Client",
+        filters=filters,
+        fields=["name", *TARGET_INPUT_FIELDS, *TARGET_FIELDS],
+        order_by="name asc"
+    )
+
+    # Latest weight per client, rows on the same date come ordered so the last one wins
+    latest_weight = {}
+    for row in frappe.db.sql(
+        """
+        select w.parent, w.weight
+        from `tabWeight Log` w
+        join (
+            select parent, max(date) as last_date
+            from `tabWeight Log`
+            where parenttype = 'Client' and parent in %(clients)s
+            group by parent
+        ) m on m.parent = w.parent and m.last_date = w.date
+        where w.parenttype = 'Client'
+        order by w.idx asc
+        """,
+        {"clients": tuple(c.name for c in clients) or ("",)},
+        as_dict=True
+    ):
+        latest_weight[row.parent] = row.weight
+
+    columns = {field: [c.get(field) for c in clients] for field in TARGET_INPUT_FIELDS}
+    columns['weight'] = [latest_weight.get(c.name) for c in clients]
+    return clients, columns
+
+def recalculate_all_targets(client_ids=None):
+    """
+    Background job: recompute targets of every non-adjusted client in one pass,
+    write changed rows with a bulk UPDATE and invalidate their caches together.
+    """
+    from ptrainer.ptrainer_methods import MembershipCache
+
+    clients, columns = load_target_inputs(client_ids)
+    if not clients:
+        return 0
+
+    results = calculate_targets_batch(columns, get_target_parameters(frappe.get_single("Ptrainer Settings")))
+
+    updates = {}
+    for i, client in enumerate(clients):
+        values = {field: results[field][i] for field in TARGET_FIELDS}
+        if any(flt(client.get(field)) != flt(value) for field, value in values.items()):
+            updates[client.name] = values
+
+    if updates:
+        frappe.db.bulk_update("Client", updates)
+        MembershipCache().invalidate_clients_caches(list(updates))
+        frappe.db.commit()
+
+    return len(updates)
+
+def summarize_values(values):
+    """Distribution summary of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {
+        'mean': round(sum(ordered) / len(ordered), 1),
+        'min': ordered[0],
+        'p10': ordered[round(last * 0.1)],
+        'median': ordered[round(last * 0.5)],
+        'p90': ordered[round(last * 0.9)],
+        'max': ordered[-1]
+    }
+
+@frappe.whitelist()
+def preview_target_changes(settings_overrides=None, limit=100):
+    """
+    Run the target formula over all non-adjusted clients with overridden settings, without saving
+    Args:
+        settings_overrides (dict): Ptrainer Settings field -> value to try
+        limit (int): Number of per-client deltas to return, largest energy change first
+    Returns:
+        dict: Distribution of new targets and deltas per target field, plus per-client deltas
+    """
+    frappe.has_permission("Ptrainer Settings", "write", throw=True)
+
+    if isinstance(settings_overrides, str):
+        settings_overrides = json.loads(settings_overrides)
+    settings_overrides = settings_overrides or {}
+
+    invalid = set(settings_overrides) - set(TARGET_SETTINGS_FIELDS)
+    if invalid:
+        frappe.throw(_("Not a target setting: {0}").format(", ".join(sorted(invalid))))
+
+    settings = frappe.get_single("Ptrainer Settings")
+    overridden = frappe._dict(settings.as_dict())
+    for field, value in settings_overrides.items():
+        if field not in ('default_gender', 'default_goal'):
+            value = flt(value) if value not in (None, "") else None
+        overridden[field] = value
+
+    clients, columns = load_target_inputs()
+    current = calculate_targets_batch(columns, get_target_parameters(settings))
+    proposed = calculate_targets_batch(columns, get_target_parameters(overridden))
+
+    deltas = {field: [p - c for p, c in zip(proposed[field], current[field])] for field in TARGET_FIELDS}
+
+    per_client = sorted(
+        (
+            {
+                'client': client.name,
+                **{field: proposed[field][i] for field in TARGET_FIELDS},
+                'delta': {field: deltas[field][i] for field in TARGET_FIELDS}
+            }
+            for i, client in enumerate(clients)
+        ),
+        key=lambda row: abs(row['delta']['target_energy']),
+        reverse=True
+    )
+
+    return {
+        'clients': len(clients),
+        'changed': sum(1 for i in range(len(clients)) if any(deltas[field][i] for field in TARGET_FIELDS)),
+        'summary': {
+            field: {'proposed': summarize_values(proposed[field]), 'delta': summarize_values(deltas[field])}
+            for field in TARGET_FIELDS
+        },
+        'per_client': per_client[:cint(limit)]
+    }
@@ -1,9 +1,111 @@
 # Copyright (c) 2024, YZ and contributors
 # For license information, please see license.txt
 
-# import frappe
+import json
+import random
+
+import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import cint
+
+FACET_FIELDS = ("primary_muscle", "level", "force", "equipment", "mechanic", "category", "enabled")
+FACET_INDEX_VERSION_KEY = "exercise_facet_index_version"
+
+# Per-worker indexes keyed by site
+_facet_indexes = {}
 
 
 class Exercise(Document):
 	pass
+
+
+class ExerciseFacetIndex:
+	"""Bitset index over Exercise facets; bit i of every mask is exercise i"""
+
+	def __init__(self, rows):
+		self.names = [row.name for row in rows]
+		self.positions = {name: i for i, name in enumerate(self.names)}
+		self.all = (1 << len(self.names)) - 1
+		self.facets = {field: {} for field in FACET_FIELDS}
+
+		for i, row in enumerate(rows):
+			bit = 1 << i
+			for field in FACET_FIELDS:
+				value = normalize_facet_value(field, row.get(field))
+				self.facets[field][value] = self.facets[field].get(value, 0) | bit
+
+	def match(self, filters):
+		"""Return the bitset of exercises matching every filter"""
+		mask = self.all
+		for field, value in filters.items():
+			if field not in self.facets:
+				frappe.throw(_("Cannot filter exercises by {0}").format(field))
+			if value in (None, ""):
+				continue
+			mask &= self.facets[field].get(normalize_facet_value(field, value), 0)
+		return mask
+
+	def sample(self, filters, k, exclude=None):
+		"""Return up to k random exercise names matching the filters"""
+		mask = self.match(filters)
+		for name in exclude or ():
+			if name in self.positions:
+				mask &= ~(1 << self.positions[name])
+
+		matches = []
+		while mask:
+			lowest = mask & -mask
+			matches.append(self.names[lowest.bit_length() - 1])
+			mask ^= lowest
+
+		return random.sample(matches, min(k, len(matches)))
+
+
+def normalize_facet_value(field, value):
+	if field == "enabled":
+		return cint(value)
+	return value or None
+
+
+def get_exercise_facet_index():
+	"""Get this worker's facet index, rebuilding it when an exercise changed"""
+	version = frappe.cache().get_value(FACET_INDEX_VERSION_KEY)
+	if not version:
+		version = frappe.generate_hash(length=10)
+		frappe.cache().set_value(FACET_INDEX_VERSION_KEY, version)
+
+	cached = _facet_indexes.get(frappe.local.site)
+	if cached and cached[0] == version:
+		return cached[1]
+
+	rows = frappe.get_all("Exercise", fields=["name", *FACET_FIELDS], order_by="name asc")
+	index = ExerciseFacetIndex(rows)
+	_facet_indexes[frappe.local.site] = (version, index)
+	return index
+
+
+def invalidate_exercise_facet_index():
+	"""Bump the index version so every worker rebuilds on next use"""
+	_facet_indexes.pop(frappe.local.site, None)
+	frappe.cache().set_value(FACET_INDEX_VERSION_KEY, frappe.generate_hash(length=10))
+
+
+@frappe.whitelist()
+def sample_exercises(filters=None, k=7, exclude=None):
+	"""
+	Randomly pick exercises matching facet filters without shipping the catalogue
+	Args:
+		filters (dict): Facet field -> value, e.g. {"primary_muscle": "Chest", "level": "Beginner"}
+		k (int): Number of exercises to return
+		exclude (list): Exercise names to leave out
+	Returns:
+		list: Exercise names
+	"""
+	if isinstance(filters, str):
+		filters = json.loads(filters)
+	if isinstance(exclude, str):
+		exclude = json.loads(exclude)
+
+	filters = {"enabled": 1, **(filters or {})}
+	return get_exercise_facet_index().sample(filters, cint(k), exclude)
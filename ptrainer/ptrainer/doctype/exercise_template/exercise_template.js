@@ -60,24 +60,20 @@ function generate_exercises(frm) {
         }
     });
 
-    // Fetch exercises matching the filters
+    // Let the server pick random exercises matching the filters
     frappe.call({
-        method: 'frappe.client.get_list',
+        method: 'ptrainer.ptrainer.doctype.exercise.exercise.sample_exercises',
         args: {
-            doctype: 'Exercise',
             filters: filters,
-            fields: ['name', 'primary_muscle', 'force'], // Add any other fields you need
-            limit_page_length: 1000  // Fetch all matching exercises
+            k: 7,
+            exclude: (frm.doc.exercises || []).map(row => row.exercise).filter(Boolean)
         },
         callback: function(r) {
             if (r.message && r.message.length > 0) {
-                // Randomly select up to 7 exercises
-                let selected_exercises = get_random_exercises(r.message, 7);
-
                 // Add the selected exercises to the child table
-                selected_exercises.forEach(function(exercise) {
+                r.message.forEach(function(exercise) {
                     let new_row = frm.add_child('exercises');
-                    frappe.model.set_value(new_row.doctype, new_row.name, 'exercise', exercise.name);
+                    frappe.model.set_value(new_row.doctype, new_row.name, 'exercise', exercise);
                 });
 
                 // Refresh the child table to show the new entries
@@ -88,14 +84,3 @@ function generate_exercises(frm) {
         }
     });
 }
-
-function get_random_exercises(exercises, count) {
-    // Shuffle the exercises array
-    for (let i = exercises.length - 1; i > 0; i--) {
-        const j = Math.floor(Math.random() * (i + 1));
-        [exercises[i], exercises[j]] = [exercises[j], exercises[i]];
-    }
-
-    // Return the first 'count' exercises (up to 7)
-    return exercises.slice(0, count);
-}
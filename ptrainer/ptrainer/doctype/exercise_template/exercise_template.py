@@ -1,9 +1,88 @@
 # Copyright (c) 2024, YZ and contributors
 # For license information, please see license.txt
 
-# import frappe
+import json
+
+import frappe
+from frappe import _
 from frappe.model.document import Document
 
+TEMPLATE_ROW_FIELDS = ("exercise", "sets", "reps", "rest", "super")
+
 
 class ExerciseTemplate(Document):
 	pass
+
+
+def get_template_rows(template_names):
+	"""
+	Get pre-flattened exercise rows for templates, reading misses in one query
+	Rows are cached in Redis only, so a template edit doesn't empty the workers' library LRUs
+	Returns:
+		dict: Template name -> list of exercise rows
+	"""
+	from ptrainer.ptrainer_methods import MembershipCache
+
+	cache = MembershipCache()
+	rows = {}
+	missing = []
+	for name in set(template_names):
+		cached = frappe.cache().get_value(cache.get_library_cache_key("Exercise Template", name))
+		if cached is None:
+			missing.append(name)
+		else:
+			rows[name] = cached
+
+	if missing:
+		fetched = {name: [] for name in frappe.get_all(
+			"Exercise Template", filters={"name": ["in", missing]}, pluck="name"
+		)}
+		for row in frappe.get_all(
+			"Exercises",
+			filters={"parenttype": "Exercise Template", "parent": ["in", list(fetched)]},
+			fields=["parent", *TEMPLATE_ROW_FIELDS],
+			order_by="parent asc, idx asc",
+		):
+			fetched[row.parent].append({field: row[field] for field in TEMPLATE_ROW_FIELDS})
+
+		for name, template_rows in fetched.items():
+			frappe.cache().set_value(
+				cache.get_library_cache_key("Exercise Template", name),
+				template_rows,
+				expires_in_sec=cache.LIBRARY_CACHE_TIMEOUT
+			)
+		rows.update(fetched)
+
+	return rows
+
+
+def invalidate_template_rows(template_name):
+	from ptrainer.ptrainer_methods import MembershipCache
+
+	frappe.cache().delete_value(MembershipCache().get_library_cache_key("Exercise Template", template_name))
+
+
+@frappe.whitelist()
+def expand_templates(templates):
+	"""
+	Expand several day templates into exercise rows in one request
+	Args:
+		templates (dict): Day prefix (d1..d7) -> Exercise Template name
+	Returns:
+		dict: Exercise table (d1_e..d7_e) -> list of exercise rows
+	"""
+	frappe.has_permission("Exercise Template", "read", throw=True)
+
+	if isinstance(templates, str):
+		templates = json.loads(templates)
+
+	for day in templates:
+		if day not in {f"d{i}" for i in range(1, 8)}:
+			frappe.throw(_("Invalid plan day: {0}").format(day))
+
+	template_rows = get_template_rows([name for name in templates.values() if name])
+	return {
+		f"{day}_e": template_rows.get(name, [])
+		for day, name in templates.items()
+		if name
+	}
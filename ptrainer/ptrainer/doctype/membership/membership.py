@@ -5,12 +5,25 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import now_datetime, add_to_date, get_datetime
 
+# Sorted set of membership names scored by their next start/end instant
+MEMBERSHIP_EVENTS_KEY = "membership_events"
+# Hash of membership name -> consecutive failed transitions, used to back off retries
+MEMBERSHIP_FAILURES_KEY = "membership_event_failures"
+RETRY_BASE_DELAY = 60  # seconds, doubled on every consecutive failure
+RETRY_MAX_DELAY = 86400
+
 class Membership(Document):
     def validate(self):
         if self.has_value_changed('package'):
             self.set_membership_dates()
         
         self.set_active_status()
+
+    def on_update(self):
+        schedule_membership_transition(self.name, self.start, self.end)
+
+    def on_trash(self):
+        unschedule_membership_transition(self.name)
     
     def set_membership_dates(self):
         if self.package:
@@ -33,11 +46,124 @@ class Membership(Document):
             end_time = get_datetime(self.end)
             
             self.active = 1 if start_time <= current_time <= end_time else 0
+
+def get_next_transition(start, end, current_time=None):
+    """Return the next instant at which a membership changes its active status"""
+    if not (start and end):
+        return None
+
+    current_time = current_time or now_datetime()
+    start_time = get_datetime(start)
+    end_time = get_datetime(end)
+
+    if current_time < start_time:
+        return start_time
+    if current_time <= end_time:
+        return end_time
+    return None
+
+def schedule_membership_transition(membership_id, start, end):
+    """Queue the membership's next start/end instant in the expiry queue"""
+    cache = frappe.cache()
+    key = cache.make_key(MEMBERSHIP_EVENTS_KEY)
+    next_transition = get_next_transition(start, end)
+
+    if next_transition:
+        cache.zadd(key, {membership_id: next_transition.timestamp()})
+    else:
+        cache.zrem(key, membership_id)
+
+def unschedule_membership_transition(membership_id):
+    """Remove a membership from the expiry queue"""
+    cache = frappe.cache()
+    cache.zrem(cache.make_key(MEMBERSHIP_EVENTS_KEY), membership_id)
+
+def process_due_memberships():
+    """
+    Lightweight tick that activates/deactivates only the memberships whose
+    start or end instant has passed. Runs every minute via the scheduler.
+    """
+    from ptrainer.ptrainer_methods import MembershipCache
+    from ptrainer.overview import invalidate_trainer_overview
+
+    cache = frappe.cache()
+    key = cache.make_key(MEMBERSHIP_EVENTS_KEY)
+    failures_key = cache.make_key(MEMBERSHIP_FAILURES_KEY)
+    current_time = now_datetime()
+
+    due = cache.zrangebyscore(key, "-inf", current_time.timestamp())
+    if not due:
+        return
+
+    membership_cache = MembershipCache()
+    for member in due:
+        membership_id = member.decode() if isinstance(member, bytes) else member
+
+        # Claim the entry so concurrent ticks don't process it twice
+        if not cache.zrem(key, membership_id):
+            continue
+
+        try:
+            membership = frappe.db.get_value(
+                "Membership",
+                membership_id,
+                ["name", "start", "end", "active"],
+                as_dict=True
+            )
+            if not membership:
+                continue
+
+            start_time = get_datetime(membership.start)
+            end_time = get_datetime(membership.end)
+            active = 1 if start_time <= current_time <= end_time else 0
+
+            if active != membership.active:
+                frappe.db.set_value(
+                    "Membership",
+                    membership_id,
+                    "active",
+                    active,
+                    update_modified=False
+                )
+                membership_cache.invalidate_membership_cache(membership_id)
+                invalidate_trainer_overview()
+
+            schedule_membership_transition(membership_id, membership.start, membership.end)
+            cache.hdel(failures_key, membership_id)
+        except Exception:
+            frappe.log_error(f"Membership Transition Error: {membership_id}")
+            # Put it back with an exponential backoff so a bad row doesn't retry every tick
+            failures = cache.hincrby(failures_key, membership_id, 1)
+            delay = min(RETRY_BASE_DELAY * 2 ** (failures - 1), RETRY_MAX_DELAY)
+            cache.zadd(key, {membership_id: current_time.timestamp() + delay})
+
+    frappe.db.commit()
+
+def rebuild_membership_queue():
+    """Re-seed the expiry queue from the database, after a migrate and hourly in case Redis was flushed"""
+    current_time = now_datetime()
+    memberships = frappe.get_all(
+        "Membership",
+        filters={"end": [">=", current_time]},
+        fields=["name", "start", "end", "active"]
+    )
+
+    cache = frappe.cache()
+    key = cache.make_key(MEMBERSHIP_EVENTS_KEY)
+    for membership in memberships:
+        if get_datetime(membership.start) <= current_time and not membership.active:
+            # Start was missed while the queue was empty, let the next tick activate it
+            cache.zadd(key, {membership.name: current_time.timestamp()})
+        else:
+            schedule_membership_transition(membership.name, membership.start, membership.end)
+
+    return len(memberships)
             
 def update_membership_statuses():
     """
     Background job to update active status of all memberships.
-    This runs hourly via the scheduler.
+    This runs hourly via the scheduler as a safety net for the expiry queue,
+    which handles transitions in near real time.
     """
     frappe.log("Starting membership status update job")
     try:
@@ -64,8 +190,11 @@ def update_membership_statuses():
                 )
         
         frappe.db.commit()
+
+        # Make sure every pending transition is queued
+        queued = rebuild_membership_queue()
         
-        frappe.log(f"Membership status update completed. Checked {len(active_memberships)} active memberships.")
+        frappe.log(f"Membership status update completed. Checked {len(active_memberships)} active memberships, queued {queued} transitions.")
         
     except Exception as e:
         frappe.log_error("Membership Status Update Error")
\ No newline at end of file
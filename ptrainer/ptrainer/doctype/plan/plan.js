@@ -3,6 +3,11 @@ frappe.ui.form.on('Plan', {
         frm.add_custom_button(__('Fetch Previous'), function() {
             fetch_previous_plan(frm);
         });
+        if (!frm.is_new()) {
+            frm.add_custom_button(__('Suggest Progression'), function() {
+                show_progression_suggestions(frm);
+            });
+        }
         if (has_required_fields(frm)) {
             const message = generate_summary_html(frm);
             frm.set_intro(message, 'orange');
@@ -63,7 +68,7 @@ frappe.ui.form.on('Plan', {
 ['d1', 'd2', 'd3', 'd4', 'd5', 'd6', 'd7'].forEach(day => {
     frappe.ui.form.on('Plan', {
         [`${day}_template`]: function(frm) {
-            populate_exercises(frm, `${day}_template`, `${day}_e`);
+            queue_template_expansion(frm, day);
         }
     });
 });
@@ -140,10 +145,17 @@ function setup_food_filters(frm) {
     ['d1_f', 'd2_f', 'd3_f', 'd4_f', 'd5_f', 'd6_f', 'd7_f'].forEach(fieldName => {
         frm.fields_dict[fieldName].grid.get_field('food').get_query = function() {
             return {
-                filters: [
-                    ['name', 'not in', get_blocked_foods(frm)],
-                    ['enabled', '=', 1]
-                ]
+                query: 'ptrainer.search.search_food',
+                filters: {
+                    blocked_foods: get_blocked_foods(frm)
+                }
+            };
+        };
+    });
+    ['d1_e', 'd2_e', 'd3_e', 'd4_e', 'd5_e', 'd6_e', 'd7_e'].forEach(fieldName => {
+        frm.fields_dict[fieldName].grid.get_field('exercise').get_query = function() {
+            return {
+                query: 'ptrainer.search.search_exercise'
             };
         };
     });
@@ -237,101 +249,92 @@ function handle_membership_selection(frm, memberships) {
     }
 }
 
-function populate_exercises(frm, template_field, exercise_table) {
-    if (frm.doc[template_field]) {
-        frm.doc[exercise_table] = [];
-        
-        frappe.call({
-            method: 'frappe.client.get',
-            args: {
-                doctype: 'Exercise Template',
-                name: frm.doc[template_field]
-            },
-            callback: function(response) {
-                if (response.message?.exercises) {
-                    response.message.exercises.forEach(exercise => {
-                        frm.add_child(exercise_table, {
-                            exercise: exercise.exercise,
-                            sets: exercise.sets,
-                            reps: exercise.reps,
-                            rest: exercise.rest,
-                            super: exercise.super
-                        });
-                    });
-                    frm.refresh_field(exercise_table);
-                }
-            }
-        });
-    }
+// Template changes made in quick succession are expanded in a single call
+let pending_template_days = new Set();
+let template_expansion_timer = null;
+
+function queue_template_expansion(frm, day) {
+    pending_template_days.add(day);
+    clearTimeout(template_expansion_timer);
+    template_expansion_timer = setTimeout(() => {
+        const days = Array.from(pending_template_days);
+        pending_template_days = new Set();
+        populate_exercises(frm, days);
+    }, 300);
+}
+
+function populate_exercises(frm, days) {
+    const templates = {};
+    days.forEach(day => {
+        if (frm.doc[`${day}_template`]) {
+            templates[day] = frm.doc[`${day}_template`];
+        }
+    });
+    if (!Object.keys(templates).length) return;
+
+    frappe.call({
+        method: 'ptrainer.ptrainer.doctype.exercise_template.exercise_template.expand_templates',
+        args: { templates: templates },
+        callback: function(response) {
+            if (!response.message) return;
+
+            Object.entries(response.message).forEach(([exercise_table, rows]) => {
+                frm.clear_table(exercise_table);
+                rows.forEach(row => frm.add_child(exercise_table, row));
+                frm.refresh_field(exercise_table);
+            });
+        }
+    });
 }
 
 function fetch_previous_plan(frm) {
+    if (frm.is_new() || frm.is_dirty()) {
+        frappe.msgprint(__('Please save the plan before fetching the previous one.'));
+        return;
+    }
+
     frappe.call({
-        method: 'frappe.client.get_list',
+        method: 'ptrainer.ptrainer.doctype.plan.plan.clone_plan',
         args: {
-            doctype: 'Plan',
-            filters: {
-                client: frm.doc.client,
-                membership: frm.doc.membership,
-                name: ['!=', frm.doc.name]
-            },
-            fields: ['name'],
-            order_by: 'creation desc',
-            limit: 1
+            target: frm.doc.name
         },
+        freeze: true,
+        freeze_message: __('Fetching previous plan...'),
         callback: function(response) {
-            if (response.message && response.message.length > 0) {
-                const previous_plan_name = response.message[0].name;
-                
-                // Fetch only the specified fields of the previous plan document
-                frappe.call({
-                    method: 'frappe.client.get',
-                    args: {
-                        doctype: 'Plan',
-                        name: previous_plan_name,
-                        fields: [
-                            'd1_cheat', 'd1_rest', 'd2_cheat', 'd2_rest', 'd3_cheat', 'd3_rest',
-                            'd4_cheat', 'd4_rest', 'd5_cheat', 'd5_rest', 'd6_cheat', 'd6_rest',
-                            'd7_cheat', 'd7_rest'
-                        ].concat(
-                            ['d1_e', 'd2_e', 'd3_e', 'd4_e', 'd5_e', 'd6_e', 'd7_e', 
-                             'd1_f', 'd2_f', 'd3_f', 'd4_f', 'd5_f', 'd6_f', 'd7_f']
-                        )
-                    },
-                    callback: function(res) {
-                        if (res.message) {
-                            const previous_data = res.message;
-                            populate_form_with_previous_data(frm, previous_data);
-                        }
-                    }
+            if (response.message) {
+                frm.reload_doc();
+                frappe.show_alert({
+                    message: __('Previous plan data has been fetched and populated.'),
+                    indicator: 'green'
                 });
-            } else {
-                frappe.msgprint(__('No previous plan found for this client and membership.'));
             }
         }
     });
 }
 
-function populate_form_with_previous_data(frm, previous_data) {
-    // Populate check fields
-    for (let i = 1; i <= 7; i++) {
-        frm.set_value(`d${i}_cheat`, previous_data[`d${i}_cheat`]);
-        frm.set_value(`d${i}_rest`, previous_data[`d${i}_rest`]);
-    }
+function show_progression_suggestions(frm) {
+    frappe.call({
+        method: 'ptrainer.performance.get_plan_suggestions',
+        args: { plans: [frm.doc.name] },
+        callback: function(r) {
+            const suggestions = (r.message || {})[frm.doc.name] || {};
+            const rows = Object.entries(suggestions).map(([exercise, s]) =>
+                `<tr><td>${frappe.utils.escape_html(exercise)}</td><td>${s.weight}</td><td>${s.reps}</td><td>${__(s.basis.replace(/_/g, ' '))}</td></tr>`
+            );
 
-    // Populate child tables
-    const child_table_fields = ['d1_e', 'd2_e', 'd3_e', 'd4_e', 'd5_e', 'd6_e', 'd7_e', 'd1_f', 'd2_f', 'd3_f', 'd4_f', 'd5_f', 'd6_f', 'd7_f'];
-    
-    child_table_fields.forEach(table => {
-        if (previous_data[table] && Array.isArray(previous_data[table])) {
-            frm.clear_table(table);
-            previous_data[table].forEach(row_data => {
-                const child = frm.add_child(table);
-                Object.assign(child, row_data);
+            if (!rows.length) {
+                frappe.msgprint(__('No performance history found for the exercises in this plan.'));
+                return;
+            }
+
+            frappe.msgprint({
+                title: __('Progression Suggestions'),
+                wide: true,
+                message: `<table class="table table-bordered">
+                    <thead><tr><th>${__('Exercise')}</th><th>${__('Weight')}</th><th>${__('Reps')}</th><th>${__('Basis')}</th></tr></thead>
+                    <tbody>${rows.join('')}</tbody>
+                </table>`
             });
-            frm.refresh_field(table);
         }
     });
-    
-    frappe.msgprint(__('Previous plan data has been fetched and populated.'));
 }
\ No newline at end of file
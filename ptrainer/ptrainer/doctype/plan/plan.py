@@ -3,17 +3,45 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import format_date, getdate, add_days, nowdate, get_first_day_of_week, get_last_day_of_week
+from frappe import _
+from frappe.utils import format_date, getdate, add_days, nowdate, now_datetime, cint, flt, get_first_day_of_week, get_last_day_of_week
 from ptrainer.config.nutrition import get_nutrient_mappings
+from ptrainer import profiling
 import json
 
+DAYS = range(1, 8)
+EXERCISE_TABLES = tuple(f"d{day}_e" for day in DAYS)
+FOOD_TABLES = tuple(f"d{day}_f" for day in DAYS)
+DAY_FLAGS = tuple(f"d{day}_{flag}" for day in DAYS for flag in ("cheat", "rest"))
+DAY_TEMPLATES = tuple(f"d{day}_template" for day in DAYS)
+DAY_MACROS = tuple(f"{table}_macro" for table in FOOD_TABLES)
+
+# Data fields copied when cloning child rows between plans
+CHILD_ROW_FIELDS = {
+    "Exercises": ("super", "exercise", "sets", "reps", "rest"),
+    "Foods": ("meal", "food", "amount"),
+}
+
+# Plan fields fetched from the client (see fetch_from in plan.json)
+CLIENT_FETCH_FIELDS = {
+    "target_proteins": "target_proteins",
+    "target_carbs": "target_carbs",
+    "target_fats": "target_fats",
+    "target_energy": "target_energy",
+    "target_water": "target_water",
+    "equipment": "equipment",
+    "goal": "goal",
+    "weekly_workouts": "workouts",
+    "daily_meals": "meals",
+    "blocked_foods": "blocked_foods",
+}
+
 class Plan(Document):
     def before_save(self):
         self.old_food_hash = self.get('__food_hash')
     def before_insert(self):
         # Fetch membership details
-        membership = frappe.get_doc('Membership', self.membership)
-        membership_start = getdate(membership.start)
+        membership_start = frappe.db.get_value('Membership', self.membership, 'start')
 
         # Fetch existing plan docs for the same client and membership
         existing_plans = frappe.get_all('Plan', filters={
@@ -21,59 +49,343 @@ class Plan(Document):
             'membership': self.membership
         }, fields=['start', 'end'], order_by='end desc')
 
-        # Determine the start date for the new plan
-        if existing_plans:
-            # Get the plan with the latest 'end' date
-            last_plan = existing_plans[0]
-            last_end_date = getdate(last_plan['end'])
-            # Nearest Monday after the last plan end date
-            self.start = get_first_day_of_week(add_days(last_end_date, 1))
-        else:
-            # Set the start date to the nearest Monday AFTER the membership start
-            first_monday = get_first_day_of_week(membership_start)
+        # Determine the start and end dates for the new plan
+        last_end = existing_plans[0]['end'] if existing_plans else None
+        self.start, self.end = get_plan_dates(last_end, membership_start)
 
-            # If membership start is not a Monday, move to the next Monday
-            if first_monday < membership_start:
-                self.start = add_days(first_monday, 7)
-            else:
-                self.start = first_monday
+        # Set the status based on the current date
+        self.status = get_plan_status(self.start, self.end)
 
-        # Set the end date to the following Sunday
-        self.end = get_last_day_of_week(self.start)
+        # Generate the title field
+        client_name = frappe.db.get_value('Client', self.client, 'client_name')
+        self.title = get_plan_title(client_name, self.start, self.end)
 
-        # Set the status based on the current date
-        current_date = getdate(nowdate())
-        if self.start <= current_date <= self.end:
-            self.status = 'Active'
-        elif current_date > self.end:
-            self.status = 'Completed'
+        for fieldname in get_rest_day_flags(self.weekly_workouts):
+            self.set(fieldname, 1)
+
+def get_plan_dates(last_end, membership_start):
+    """Return (start, end) of the next weekly plan for a membership"""
+    if last_end:
+        # Nearest Monday after the last plan end date
+        start = get_first_day_of_week(add_days(getdate(last_end), 1))
+    else:
+        # Set the start date to the nearest Monday AFTER the membership start
+        membership_start = getdate(membership_start)
+        first_monday = get_first_day_of_week(membership_start)
+
+        # If membership start is not a Monday, move to the next Monday
+        if first_monday < membership_start:
+            start = add_days(first_monday, 7)
         else:
-            self.status = 'Scheduled'
+            start = first_monday
 
-        # Generate the title field
-        client = frappe.get_doc('Client', self.client)
-        client_name = client.client_name.split()
+    # The plan ends on the following Sunday
+    return start, get_last_day_of_week(start)
+
+def get_plan_status(start, end, current_date=None):
+    """Return the plan status for the given dates"""
+    current_date = current_date or getdate(nowdate())
+    if start <= current_date <= end:
+        return 'Active'
+    elif current_date > end:
+        return 'Completed'
+    return 'Scheduled'
 
-        first_name = client_name[0]  # First name initial
-        if len(client_name) > 1:
-            last_initial = client_name[-1][0].upper()  # Last name initial
+def get_plan_title(client_name, start, end):
+    """Build the plan title, e.g. JohnD@06/01-12/01#25"""
+    client_name = client_name.split()
+
+    first_name = client_name[0]  # First name initial
+    if len(client_name) > 1:
+        last_initial = client_name[-1][0].upper()  # Last name initial
+    else:
+        last_initial = ""
+
+    start_dd_mm = format_date(start, "dd/MM")
+    end_dd_mm = format_date(end, "dd/MM")
+    year = format_date(start, "YY")
+
+    return f"{first_name}{last_initial}@{start_dd_mm}-{end_dd_mm}#{year}"
+
+def get_rest_day_flags(weekly_workouts):
+    """Return the dN_rest fields implied by the number of weekly workouts"""
+    weekly_workouts = cint(weekly_workouts)
+    if not 6 >= weekly_workouts >= 3:
+        return []
+    return [f"d{day}_rest" for day in range(weekly_workouts + 1, 8)]
+
+def copy_plan_rows(source_map):
+    """
+    Bulk copy all day child rows between plans.
+    Args:
+        source_map (dict): target plan name -> source plan name
+    Returns:
+        int: Number of copied rows
+    """
+    if not source_map:
+        return 0
+
+    targets_by_source = {}
+    for target, source in source_map.items():
+        targets_by_source.setdefault(source, []).append(target)
+
+    now = now_datetime()
+    user = frappe.session.user
+    copied = 0
+
+    for child_doctype, data_fields in CHILD_ROW_FIELDS.items():
+        rows = frappe.get_all(
+            child_doctype,
+            filters={
+                "parenttype": "Plan",
+                "parent": ["in", list(targets_by_source)]
+            },
+            fields=["parent", "parentfield", "idx", *data_fields],
+            order_by="parent asc, parentfield asc, idx asc"
+        )
+
+        values = [
+            (
+                frappe.generate_hash(length=10), target, "Plan", row.parentfield, row.idx,
+                user, now, now, user, 0,
+                *(row[field] for field in data_fields)
+            )
+            for row in rows
+            for target in targets_by_source[row.parent]
+        ]
+
+        if values:
+            frappe.db.bulk_insert(
+                child_doctype,
+                fields=[
+                    "name", "parent", "parenttype", "parentfield", "idx",
+                    "owner", "creation", "modified", "modified_by", "docstatus",
+                    *data_fields
+                ],
+                values=values
+            )
+            copied += len(values)
+
+    return copied
+
+def format_macro_summary(totals):
+    """Format day totals the same way the Plan form does"""
+    return (
+        f"Protein: {round(totals['protein'])}g + "
+        f"Carbs: {round(totals['carbs'])}g + "
+        f"Fat: {round(totals['fat'])}g = "
+        f"{round(totals['energy'])} kcal"
+    )
+
+def get_plan_macros(plan_name):
+    """Recompute the dN_f_macro summaries of a saved plan from its food rows"""
+    all_food_data = {}
+    for row in frappe.get_all(
+        "Foods",
+        filters={"parenttype": "Plan", "parent": plan_name},
+        fields=["parentfield", "food", "amount"],
+        order_by="idx asc"
+    ):
+        if row.food and row.amount:
+            all_food_data.setdefault(row.parentfield, []).append({
+                'food_docname': row.food,
+                'amount_in_grams': flt(row.amount)
+            })
+
+    totals = calculate_all_nutritional_totals(all_food_data) if all_food_data else {}
+    return {
+        f"{table}_macro": format_macro_summary(totals[table]) if table in totals else None
+        for table in FOOD_TABLES
+    }
+
+@frappe.whitelist()
+def clone_plan(source=None, target=None):
+    """
+    Copy day flags and all dN_e/dN_f rows from one plan to another server-side.
+    Args:
+        source (str): Plan to copy from. Defaults to the previous plan of the target's membership
+        target (str): Plan to copy into
+    Returns:
+        dict: The refreshed target plan
+    """
+    from ptrainer.handlers import on_plan_update
+
+    target_plan = frappe.db.get_value("Plan", target, ["name", "client", "membership"], as_dict=True)
+    if not target_plan:
+        frappe.throw(_("Plan {0} not found").format(target))
+    frappe.has_permission("Plan", "write", target, throw=True)
+
+    if not source:
+        previous = frappe.get_all(
+            "Plan",
+            filters={
+                "client": target_plan.client,
+                "membership": target_plan.membership,
+                "name": ["!=", target]
+            },
+            fields=["name"],
+            order_by="creation desc",
+            limit=1
+        )
+        if not previous:
+            frappe.throw(_("No previous plan found for this client and membership."))
+        source = previous[0].name
+    if source == target:
+        frappe.throw(_("Cannot clone a plan into itself."), frappe.ValidationError)
+    frappe.has_permission("Plan", "read", source, throw=True)
+
+    source_values = frappe.db.get_value("Plan", source, [*DAY_FLAGS, *DAY_TEMPLATES], as_dict=True)
+
+    # Replace the target's day rows with the source's in bulk
+    for child_doctype in CHILD_ROW_FIELDS:
+        frappe.db.delete(child_doctype, {"parenttype": "Plan", "parent": target})
+    copy_plan_rows({target: source})
+
+    frappe.db.set_value("Plan", target, {**source_values, **get_plan_macros(target)})
+
+    # The direct writes skip the doc events, run the Plan update handler on the result
+    target_doc = frappe.get_doc("Plan", target)
+    on_plan_update(target_doc, "on_update")
+
+    return target_doc.as_dict()
+
+def create_next_week_plans(memberships=None):
+    """
+    Create next week's plan for every active membership (or the given ones),
+    cloning the previous plan's days server-side in bulk.
+    """
+    from ptrainer.ptrainer_methods import MembershipCache
+    from ptrainer.overview import invalidate_trainer_overview
+
+    if isinstance(memberships, str):
+        memberships = json.loads(memberships)
+
+    filters = {"active": 1}
+    if memberships:
+        filters["name"] = ["in", memberships]
+
+    membership_rows = frappe.get_all(
+        "Membership",
+        filters=filters,
+        fields=["name", "client", "start", "end"]
+    )
+    if not membership_rows:
+        return {"created": 0, "skipped": 0}
+
+    membership_ids = [m.name for m in membership_rows]
+    client_ids = list({m.client for m in membership_rows})
+
+    clients = {
+        c.name: c for c in frappe.get_all(
+            "Client",
+            filters={"name": ["in", client_ids], "enabled": 1},
+            fields=["name", "client_name", *set(CLIENT_FETCH_FIELDS.values())]
+        )
+    }
+
+    # Latest plan per membership (rows are ordered so the first one wins)
+    last_plans = {}
+    for plan in frappe.get_all(
+        "Plan",
+        filters={"membership": ["in", membership_ids]},
+        fields=["name", "membership", "end", *DAY_FLAGS, *DAY_TEMPLATES, *DAY_MACROS],
+        order_by="end desc"
+    ):
+        last_plans.setdefault(plan.membership, plan)
+
+    current_date = getdate(nowdate())
+    this_monday = get_first_day_of_week(current_date)
+    next_monday = add_days(this_monday, 7)
+    now = now_datetime()
+    user = frappe.session.user
+
+    new_plans = []
+    for membership in membership_rows:
+        client = clients.get(membership.client)
+        if not client:
+            continue
+
+        last_plan = last_plans.get(membership.name)
+        start, end = get_plan_dates(last_plan.end if last_plan else None, membership.start)
+        if start < this_monday:
+            # Plans fell behind, resume from this week instead of back-filling past weeks
+            start, end = this_monday, get_last_day_of_week(this_monday)
+
+        # Next week is already planned, or the membership ends before the plan starts
+        if start > next_monday or (membership.end and start > getdate(membership.end)):
+            continue
+
+        plan = {
+            "client": client.name,
+            "membership": membership.name,
+            "start": start,
+            "end": end,
+            "status": get_plan_status(start, end, current_date),
+            "title": get_plan_title(client.client_name, start, end),
+            **{field: client.get(source) for field, source in CLIENT_FETCH_FIELDS.items()},
+        }
+
+        if last_plan:
+            plan.update({field: last_plan.get(field) for field in (*DAY_FLAGS, *DAY_TEMPLATES, *DAY_MACROS)})
         else:
-            last_initial = ""
-
-        start_dd_mm = format_date(self.start, "dd/MM")
-        end_dd_mm = format_date(self.end, "dd/MM")
-        year = format_date(self.start, "YY")
-
-        # Construct the title in the desired format
-        self.title = f"{first_name}{last_initial}@{start_dd_mm}-{end_dd_mm}#{year}"
-        if 6 >= self.weekly_workouts >= 3:
-            self.d7_rest = 1
-            if self.weekly_workouts < 6:
-                self.d6_rest = 1
-            if self.weekly_workouts < 5:
-                self.d5_rest = 1
-            if self.weekly_workouts < 4:
-                self.d4_rest = 1
+            plan.update({field: 1 for field in get_rest_day_flags(client.workouts)})
+
+        new_plans.append((plan, last_plan.name if last_plan else None))
+
+    if not new_plans:
+        return {"created": 0, "skipped": len(membership_rows)}
+
+    # Titles are used as names, so make them unique against existing plans and the batch
+    taken = set(frappe.get_all(
+        "Plan",
+        filters={"start": ["in", list({p["start"] for p, source in new_plans})]},
+        pluck="name"
+    ))
+    for plan, source in new_plans:
+        title, suffix = plan["title"], 1
+        while title in taken:
+            suffix += 1
+            title = f"{plan['title']}-{suffix}"
+        taken.add(title)
+        plan["title"] = title
+
+    plan_fields = list(new_plans[0][0])
+    frappe.db.bulk_insert(
+        "Plan",
+        fields=["name", "owner", "creation", "modified", "modified_by", "docstatus", *plan_fields],
+        values=[
+            (plan["title"], user, now, now, user, 0, *(plan[field] for field in plan_fields))
+            for plan, source in new_plans
+        ]
+    )
+
+    copy_plan_rows({plan["title"]: source for plan, source in new_plans if source})
+
+    cache = MembershipCache()
+    for plan, source in new_plans:
+        cache.invalidate_membership_cache(plan["membership"])
+    # bulk_insert skips the Plan doc events
+    invalidate_trainer_overview()
+
+    frappe.db.commit()
+
+    return {
+        "created": len(new_plans),
+        "skipped": len(membership_rows) - len(new_plans),
+        "plans": [plan["title"] for plan, source in new_plans]
+    }
+
+@frappe.whitelist()
+def rollover_plans(memberships=None):
+    """Enqueue creation of next week's plans for all (or the selected) active memberships"""
+    frappe.has_permission("Plan", "create", throw=True)
+    frappe.enqueue(
+        "ptrainer.ptrainer.doctype.plan.plan.create_next_week_plans",
+        queue="long",
+        timeout=1800,
+        memberships=memberships
+    )
+    return {"message": _("Weekly plan rollover has been queued.")}
 
 @frappe.whitelist()
 def calculate_all_nutritional_totals(all_food_data):
@@ -87,6 +399,12 @@ def calculate_all_nutritional_totals(all_food_data):
     if isinstance(all_food_data, str):
         all_food_data = json.loads(all_food_data)
 
+    with profiling.profile("calculate_all_nutritional_totals"):
+        return compute_nutritional_totals(all_food_data)
+
+def compute_nutritional_totals(all_food_data):
+    """Nutritional totals per food table, see calculate_all_nutritional_totals"""
+
     # Get nutrient mappings from config
     NUTRIENT_MAPPING = get_nutrient_mappings()
 
@@ -100,16 +418,17 @@ def calculate_all_nutritional_totals(all_food_data):
     # Bulk fetch all food documents
     food_docs = {}
     if all_food_docnames:
-        food_list = frappe.get_all(
-            'Food',
-            filters={'name': ['in', list(all_food_docnames)]},
-            fields=['name']
-        )
-        
-        food_docs = {
-            doc.name: frappe.get_doc('Food', doc.name) 
-            for doc in food_list
-        }
+        with profiling.stage('food_docs'):
+            food_list = frappe.get_all(
+                'Food',
+                filters={'name': ['in', list(all_food_docnames)]},
+                fields=['name']
+            )
+            
+            food_docs = {
+                doc.name: frappe.get_doc('Food', doc.name) 
+                for doc in food_list
+            }
 
     def find_nutrient_value(facts, nutrient_type):
         """
@@ -126,38 +445,40 @@ def calculate_all_nutritional_totals(all_food_data):
         return 0
 
     # Pre-process nutritional facts for each food
-    food_nutrients = {}
-    for food_name, food_doc in food_docs.items():
-        nutrients = {}
-        if food_doc.nutritional_facts:
-            # Find values for each nutrient type using the mapping
-            for nutrient_type in ['carbs', 'protein', 'fat']:
-                nutrients[nutrient_type] = find_nutrient_value(food_doc.nutritional_facts, nutrient_type)
+    with profiling.stage('nutrients'):
+        food_nutrients = {}
+        for food_name, food_doc in food_docs.items():
+            nutrients = {}
+            if food_doc.nutritional_facts:
+                # Find values for each nutrient type using the mapping
+                for nutrient_type in ['carbs', 'protein', 'fat']:
+                    nutrients[nutrient_type] = find_nutrient_value(food_doc.nutritional_facts, nutrient_type)
         
-        # Calculate energy based on macros
-        nutrients['energy'] = (
-            nutrients.get('carbs', 0) * 4 + 
-            nutrients.get('protein', 0) * 4 + 
-            nutrients.get('fat', 0) * 9
-        )
+            # Calculate energy based on macros
+            nutrients['energy'] = (
+                nutrients.get('carbs', 0) * 4 + 
+                nutrients.get('protein', 0) * 4 + 
+                nutrients.get('fat', 0) * 9
+            )
 
-        food_nutrients[food_name] = nutrients
+            food_nutrients[food_name] = nutrients
 
     # Calculate totals for each table
-    results = {}
-    for table_id, food_data in all_food_data.items():
-        totals = {'energy': 0, 'carbs': 0, 'protein': 0, 'fat': 0}
+    with profiling.stage('totals'):
+        results = {}
+        for table_id, food_data in all_food_data.items():
+            totals = {'energy': 0, 'carbs': 0, 'protein': 0, 'fat': 0}
         
-        for item in food_data:
-            food_name = item['food_docname']
-            if food_name in food_nutrients:
-                amount_multiplier = float(item['amount_in_grams']) / 100
-                nutrients = food_nutrients[food_name]
+            for item in food_data:
+                food_name = item['food_docname']
+                if food_name in food_nutrients:
+                    amount_multiplier = float(item['amount_in_grams']) / 100
+                    nutrients = food_nutrients[food_name]
                 
-                for nutrient_key in totals:
-                    if nutrient_key in nutrients:
-                        totals[nutrient_key] += nutrients[nutrient_key] * amount_multiplier
+                    for nutrient_key in totals:
+                        if nutrient_key in nutrients:
+                            totals[nutrient_key] += nutrients[nutrient_key] * amount_multiplier
         
-        results[table_id] = totals
+            results[table_id] = totals
 
     return results
@@ -0,0 +1,16 @@
+frappe.listview_settings['Plan'] = {
+    onload: function(listview) {
+        listview.page.add_inner_button(__('Roll Over Next Week'), function() {
+            frappe.confirm(__('Create next week\'s plan for every active membership?'), function() {
+                frappe.call({
+                    method: 'ptrainer.ptrainer.doctype.plan.plan.rollover_plans',
+                    callback: function(r) {
+                        if (r.message) {
+                            frappe.show_alert({ message: r.message.message, indicator: 'green' });
+                        }
+                    }
+                });
+            });
+        });
+    }
+};
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, YZ and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Profile Log", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -1,7 +1,28 @@
 // Copyright (c) 2024, YZ and contributors
 // For license information, please see license.txt
 
+const TARGET_SETTINGS_FIELDS = [
+    'default_height', 'default_weight', 'default_gender', 'default_goal', 'default_age',
+    'activity_factor_sedentary', 'activity_factor_light', 'activity_factor_moderate',
+    'activity_factor_very', 'activity_factor_extra',
+    'bmr_weight_multiplier', 'bmr_height_multiplier', 'bmr_age_multiplier',
+    'bmr_male_constant', 'bmr_female_constant',
+    'weight_loss_calorie_deficit', 'muscle_gain_calorie_surplus', 'weight_gain_calorie_surplus',
+    'protein_multiplier_loss', 'carb_multiplier_loss', 'fat_multiplier_loss',
+    'protein_multiplier_building', 'carb_multiplier_building', 'fat_multiplier_building',
+    'protein_multiplier_gain', 'carb_multiplier_gain', 'fat_multiplier_gain',
+    'protein_multiplier_maintenance', 'carb_multiplier_maintenance', 'fat_multiplier_maintenance',
+    'protein_calories_per_gram', 'fat_calories_per_gram', 'carb_calories_per_gram',
+    'water_multiplier', 'water_bonus_very_active', 'water_bonus_extra_active',
+    'water_bonus_moderate', 'water_bonus_light'
+];
+
 frappe.ui.form.on('Ptrainer Settings', {
+    refresh: function(frm) {
+        frm.add_custom_button(__('Preview Target Changes'), function() {
+            preview_target_changes(frm);
+        });
+    },
     fetch_premade_exercises: function(frm) {
         frm.call({
             doc: frm.doc,
@@ -13,6 +34,16 @@ frappe.ui.form.on('Ptrainer Settings', {
             }
         });
     },
+    warm_cache: function(frm) {
+        frappe.call({
+            method: 'ptrainer.warmup.enqueue_warm_up',
+            callback: function(r) {
+                if (r.message) {
+                    frappe.show_alert({ message: __(r.message.message), indicator: 'green' });
+                }
+            }
+        });
+    },
     fetch_premade_foods: function(frm) {
         frm.call({
             doc: frm.doc,
@@ -25,3 +56,44 @@ frappe.ui.form.on('Ptrainer Settings', {
         });
     }
 });
+
+function preview_target_changes(frm) {
+    // Try the unsaved values of the form against every client
+    const overrides = {};
+    TARGET_SETTINGS_FIELDS.forEach(field => {
+        overrides[field] = frm.doc[field];
+    });
+
+    frappe.call({
+        method: 'ptrainer.ptrainer.doctype.client.client.preview_target_changes',
+        args: { settings_overrides: overrides, limit: 20 },
+        freeze: true,
+        freeze_message: __('Calculating targets...'),
+        callback: function(r) {
+            if (!r.message) return;
+
+            const labels = {
+                target_energy: __('Energy'),
+                target_proteins: __('Proteins'),
+                target_carbs: __('Carbs'),
+                target_fats: __('Fats'),
+                target_water: __('Water')
+            };
+            const rows = Object.entries(r.message.summary).map(([field, s]) => {
+                if (!s.delta) return '';
+                return `<tr><td>${labels[field]}</td><td>${s.proposed.median}</td>` +
+                       `<td>${s.delta.mean}</td><td>${s.delta.min}</td><td>${s.delta.max}</td></tr>`;
+            });
+
+            frappe.msgprint({
+                title: __('Target Changes Preview'),
+                wide: true,
+                message: `<p>${__('{0} of {1} clients would change.', [r.message.changed, r.message.clients])}</p>
+                    <table class="table table-bordered">
+                        <thead><tr><th></th><th>${__('New Median')}</th><th>${__('Mean Change')}</th><th>${__('Min Change')}</th><th>${__('Max Change')}</th></tr></thead>
+                        <tbody>${rows.join('')}</tbody>
+                    </table>`
+            });
+        }
+    });
+}
\ No newline at end of file
@@ -8,6 +8,19 @@ from frappe.model.document import Document
 import os
 
 class PtrainerSettings(Document):
+    def on_update(self):
+        from ptrainer.ptrainer.doctype.client.client import TARGET_SETTINGS_FIELDS
+
+        # Refresh stored targets of every client when the formula changes
+        if any(self.has_value_changed(field) for field in TARGET_SETTINGS_FIELDS):
+            frappe.enqueue(
+                "ptrainer.ptrainer.doctype.client.client.recalculate_all_targets",
+                queue="long",
+                job_id="recalculate_all_targets",
+                deduplicate=True,
+                enqueue_after_commit=True
+            )
+
     @frappe.whitelist()
     def fetch_premade_exercises(self):
         try:
@@ -0,0 +1,24 @@
+// Copyright (c) 2026, YZ and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Slowest Profile Stages"] = {
+	filters: [
+		{
+			fieldname: "from_date",
+			label: __("From Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.add_days(frappe.datetime.get_today(), -7),
+		},
+		{
+			fieldname: "to_date",
+			label: __("To Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.get_today(),
+		},
+		{
+			fieldname: "method",
+			label: __("Method"),
+			fieldtype: "Data",
+		},
+	],
+};
@@ -0,0 +1,60 @@
+# Copyright (c) 2026, YZ and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.query_builder.functions import Avg, Count, Max, Sum
+from frappe.utils import add_days, getdate
+
+
+def execute(filters=None):
+	filters = filters or {}
+	return get_columns(), get_data(filters)
+
+
+def get_columns():
+	return [
+		{"fieldname": "method", "label": _("Method"), "fieldtype": "Data", "width": 220},
+		{"fieldname": "stage", "label": _("Stage"), "fieldtype": "Data", "width": 200},
+		{"fieldname": "samples", "label": _("Samples"), "fieldtype": "Int", "width": 90},
+		{"fieldname": "avg_duration", "label": _("Avg (ms)"), "fieldtype": "Float", "precision": 2, "width": 110},
+		{"fieldname": "max_duration", "label": _("Max (ms)"), "fieldtype": "Float", "precision": 2, "width": 110},
+		{"fieldname": "total_duration", "label": _("Total (ms)"), "fieldtype": "Float", "precision": 1, "width": 120},
+		{"fieldname": "avg_queries", "label": _("Avg Queries"), "fieldtype": "Float", "precision": 1, "width": 110},
+		{"fieldname": "avg_query_duration", "label": _("Avg Query Time (ms)"), "fieldtype": "Float", "precision": 2, "width": 150},
+		{"fieldname": "avg_redis_calls", "label": _("Avg Redis Calls"), "fieldtype": "Float", "precision": 1, "width": 130},
+	]
+
+
+def get_data(filters):
+	"""Stages aggregated across profiles, slowest on average first"""
+	log = frappe.qb.DocType("Profile Log")
+	stage = frappe.qb.DocType("Profile Stage")
+
+	query = (
+		frappe.qb.from_(stage)
+		.join(log)
+		.on((stage.parent == log.name) & (stage.parenttype == "Profile Log"))
+		.select(
+			log.method,
+			stage.stage,
+			Count(stage.name).as_("samples"),
+			Avg(stage.duration).as_("avg_duration"),
+			Max(stage.duration).as_("max_duration"),
+			Sum(stage.duration).as_("total_duration"),
+			Avg(stage.queries).as_("avg_queries"),
+			Avg(stage.query_duration).as_("avg_query_duration"),
+			Avg(stage.redis_calls).as_("avg_redis_calls"),
+		)
+		.groupby(log.method, stage.stage)
+		.orderby(Avg(stage.duration), order=frappe.qb.desc)
+	)
+
+	if filters.get("from_date"):
+		query = query.where(log.creation >= getdate(filters.get("from_date")))
+	if filters.get("to_date"):
+		query = query.where(log.creation < add_days(getdate(filters.get("to_date")), 1))
+	if filters.get("method"):
+		query = query.where(log.method.like(f"%{filters.get('method')}%"))
+
+	return query.run(as_dict=True)
@@ -3,9 +3,20 @@ from typing import Dict, List, Optional, Any, TypedDict, Tuple, Set
 # from dataclasses import dataclass
 # from datetime import datetime, timedelta
 import hashlib
+import pickle
+import time
+import zlib
+from collections import OrderedDict
 # import json
 import frappe
+from frappe.utils import cint, nowdate
 from ptrainer.config.nutrition import get_nutrient_mappings
+from ptrainer.ptrainer.doctype.client.client import get_client_summary, get_client_summaries
+from ptrainer.weight_trend import get_weight_trend, downsample_trend
+from ptrainer import metrics, profiling
+from ptrainer.performance import (
+    build_performance_series, get_performance_series, series_for_response, get_progression_suggestions
+)
 
 # Type definitions
 class NutritionFact(TypedDict):
@@ -22,11 +33,71 @@ class DailyTotals(TypedDict):
 NUTRIENTS = ('energy', 'protein', 'carbs', 'fat')
 DEFAULT_UNITS = {'energy': 'kcal', 'protein': 'g', 'carbs': 'g', 'fat': 'g'}
 KCAL_TO_KJ = 4.184
+MUSCLE_GROUPS = (
+    'Abdominals', 'Abductors', 'Adductors', 'Biceps', 'Calves', 'Chest', 'Forearms', 'Glutes',
+    'Hamstrings', 'Lats', 'Lower Back', 'Middle Back', 'Neck', 'Quadriceps', 'Shoulders', 'Traps', 'Triceps'
+)
+MUSCLE_IDS = {muscle: i for i, muscle in enumerate(MUSCLE_GROUPS)}
+MUSCLE_IDS['Check'] = MUSCLE_IDS['Chest']  # Legacy typo in the Muscles options
+
+LOCAL_LIBRARY_CACHE_SIZE = 4096  # library items kept in each worker's memory
+LIBRARY_GENERATION_KEY = "library_generation"
+MEMBERSHIP_ACCESS_KEY = "membership_access"
+MEMBERSHIP_SECTIONS = ('membership', 'client', 'plans', 'references')
+COMPRESSION_HEADER = b"PTZ1"  # marks zlib-compressed pickles, anything else is a plain cached value
+COMPRESSION_LEVEL = 6
+
+# Deletes every key registered under the given tag sets, and the sets, in one call
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for _, tag in ipairs(KEYS) do
+    local keys = redis.call('SMEMBERS', tag)
+    for i = 1, #keys, 500 do
+        redis.call('DEL', unpack(keys, i, math.min(i + 499, #keys)))
+    end
+    for _, key in ipairs(keys) do
+        table.insert(deleted, key)
+    end
+    redis.call('DEL', tag)
+end
+return deleted
+"""
+
+class LocalLRUCache:
+    """Size-bounded in-process cache, least recently used entries are evicted first"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def set(self, key: str, value: Any) -> None:
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self.items.pop(key, None)
+
+    def clear(self) -> None:
+        self.items.clear()
+
+# Per-worker state keyed by site: {'generation': ..., 'lru': LocalLRUCache}
+_local_library_caches: Dict[str, Dict[str, Any]] = {}
+
+# Per-worker hit/miss counters for each cache tier
+LIBRARY_CACHE_STATS = {'local_hits': 0, 'local_misses': 0, 'redis_hits': 0, 'redis_misses': 0}
 
 class MembershipCache:
     def __init__(self):
         self.LIBRARY_CACHE_TIMEOUT = 86400 * 7  # 7 days for foods and exercises
-        self.MEMBERSHIP_CACHE_TIMEOUT = 3600 * 24  # 24 hours for membership data
+        self.MEMBERSHIP_CACHE_TIMEOUT = 86400 * 7  # 7 days, library edits invalidate dependents precisely
         
     def get_cache_key(self, prefix: str, *args) -> str:
         """Generate a consistent cache key"""
@@ -46,55 +117,100 @@ class MembershipCache:
         """Get cache key for library items (foods/exercises)"""
         return f"library:{item_type}:{item_id}"
 
+    def get_tag_key(self, tag: str) -> str:
+        """Get key of the set of cache keys registered under a tag"""
+        return f"cache_tag:{tag}"
+
+    def get_membership_tags(self, membership_id: str, data: Dict[str, Any]) -> List[str]:
+        """Tags of a membership payload: its membership, client and package"""
+        membership = data.get('membership') or {}
+        tags = [f"membership:{membership_id}"]
+        if membership.get('client'):
+            tags.append(f"client:{membership['client']}")
+        if membership.get('package'):
+            tags.append(f"package:{membership['package']}")
+        return tags
+
+    def get_library_dependents_key(self, item_type: str, item_id: str) -> str:
+        """Get key of the set of memberships whose cached payload references a library item"""
+        return f"library_dependents:{item_type}:{item_id}"
+
     def get_membership_version(self, membership_id: str) -> str:
         """Get version hash based on membership, client, and plans data"""
+        return self.get_membership_versions([membership_id]).get(membership_id)
+
+    def get_membership_versions(self, membership_ids: List[str]) -> Dict[str, str]:
+        """Version hashes of many memberships with three set-based queries"""
         try:
-            CODE_VERSION = "1.1"
-            membership_doc = frappe.get_doc("Membership", membership_id)
-            client_doc = frappe.get_doc("Client", membership_doc.client)
-            
-            plans = frappe.get_all(
-                "Plan",
-                filters={"membership": membership_id},
-                fields=["name", "modified", "modified_by"]
+            CODE_VERSION = "1.5"
+            memberships = frappe.get_all(
+                "Membership",
+                filters={"name": ["in", membership_ids]},
+                fields=["name", "client", "modified", "modified_by"]
             )
-            
-            version_parts = [
-                f"v:{CODE_VERSION}",
-                f"m:{membership_doc.modified}:{membership_doc.modified_by}",
-                f"c:{client_doc.modified}:{client_doc.modified_by}",
-                f"p:{len(plans)}",
-                f"l:{max(p.modified for p in plans) if plans else 'none'}"
-            ]
-            
-            return hashlib.md5(":".join(version_parts).encode()).hexdigest()
+            clients = {
+                c.name: c
+                for c in frappe.get_all(
+                    "Client",
+                    filters={"name": ["in", list({m.client for m in memberships}) or [""]]},
+                    fields=["name", "modified", "modified_by"]
+                )
+            }
+            plan_stats = {
+                p.membership: p
+                for p in frappe.get_all(
+                    "Plan",
+                    filters={"membership": ["in", membership_ids]},
+                    fields=["membership", "count(name) as plan_count", "max(modified) as last_modified"],
+                    group_by="membership"
+                )
+            }
+
+            versions = {}
+            for membership_doc in memberships:
+                client_doc = clients.get(membership_doc.client)
+                if not client_doc:
+                    continue
+                plans = plan_stats.get(membership_doc.name)
+                version_parts = [
+                    f"v:{CODE_VERSION}",
+                    f"m:{membership_doc.modified}:{membership_doc.modified_by}",
+                    f"c:{client_doc.modified}:{client_doc.modified_by}",
+                    f"p:{plans.plan_count if plans else 0}",
+                    f"l:{plans.last_modified if plans else 'none'}"
+                ]
+                versions[membership_doc.name] = hashlib.md5(":".join(version_parts).encode()).hexdigest()
+            return versions
         except Exception as e:
             frappe.log_error(f"Error generating membership version: {str(e)}")
-            return None
+            return {}
 
-    def get_cached_membership_data(self, membership_id: str) -> Optional[Dict[str, Any]]:
+    def get_cached_membership_data(self, membership_id: str, current_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Get cached membership data if valid"""
         cache_key = self.get_membership_cache_key(membership_id)
         version_key = self.get_plans_version_key(membership_id)
         
         cached_data = frappe.cache().get_value(cache_key)
         cached_version = frappe.cache().get_value(version_key)
-        current_version = self.get_membership_version(membership_id)
+        current_version = current_version or self.get_membership_version(membership_id)
         
         if cached_data and cached_version and cached_version == current_version:
-            return cached_data
+            metrics.incr('ptrainer_membership_cache_total', {'outcome': 'hit'})
+            return self.unpack_value(cached_data)
+        metrics.incr('ptrainer_membership_cache_total', {'outcome': 'version_mismatch' if cached_data else 'miss'})
         return None
 
-    def set_cached_membership_data(self, membership_id: str, data: Dict[str, Any]) -> None:
+    def set_cached_membership_data(self, membership_id: str, data: Dict[str, Any], version: Optional[str] = None) -> None:
         """Cache membership data with version"""
         cache_key = self.get_membership_cache_key(membership_id)
         version_key = self.get_plans_version_key(membership_id)
-        current_version = self.get_membership_version(membership_id)
+        current_version = version or self.get_membership_version(membership_id)
         
-        if current_version:
+        packed = self.pack_value(data)
+        if current_version and packed is not None:
             frappe.cache().set_value(
                 cache_key, 
-                data, 
+                packed, 
                 expires_in_sec=self.MEMBERSHIP_CACHE_TIMEOUT
             )
             frappe.cache().set_value(
@@ -102,11 +218,145 @@ class MembershipCache:
                 current_version, 
                 expires_in_sec=self.MEMBERSHIP_CACHE_TIMEOUT
             )
+            self.tag_keys(self.get_membership_tags(membership_id, data), [cache_key, version_key])
+            if data.get('references'):
+                self.register_library_dependencies(membership_id, data['references'])
+
+    def pack_value(self, data: Any) -> Any:
+        """
+        Compress a value above the configured size, as the header followed by the zlib-compressed pickle
+        Args:
+            data: Value to cache
+        Returns:
+            The value itself, its compressed form, or None when it exceeds the hard cap
+        """
+        settings = frappe.get_cached_doc("Ptrainer Settings")
+        compress_above = cint(settings.compress_cache_above) * 1024
+        max_size = cint(settings.max_cached_payload) * 1024
+        if not compress_above and not max_size:
+            return data
+
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if max_size and len(payload) > max_size:
+            metrics.incr('ptrainer_cache_refused_total')
+            return None
+        if not compress_above or len(payload) < compress_above:
+            return data
+
+        compressed = zlib.compress(payload, COMPRESSION_LEVEL)
+        metrics.observe('ptrainer_cache_compression_ratio', len(compressed) / len(payload), buckets=metrics.RATIO_BUCKETS)
+        metrics.incr('ptrainer_cache_bytes_saved_total', amount=len(payload) - len(compressed))
+        return COMPRESSION_HEADER + compressed
+
+    def unpack_value(self, value: Any) -> Any:
+        """Reverse pack_value, plain values written before compression pass through"""
+        if isinstance(value, bytes) and value.startswith(COMPRESSION_HEADER):
+            return pickle.loads(zlib.decompress(value[len(COMPRESSION_HEADER):]))
+        return value
+
+    def tag_keys(self, tags: List[str], keys: List[str]) -> None:
+        """Register cache keys under tags so they can be invalidated together"""
+        cache = frappe.cache()
+        full_keys = [cache.make_key(key) for key in keys]
+        pipeline = cache.pipeline()
+        for tag in tags:
+            tag_key = cache.make_key(self.get_tag_key(tag))
+            pipeline.sadd(tag_key, *full_keys)
+            pipeline.expire(tag_key, self.MEMBERSHIP_CACHE_TIMEOUT)
+        pipeline.execute()
+
+    def invalidate_tags(self, tags: List[str]) -> int:
+        """
+        Delete every cache key registered under any of the tags in a single Redis call
+        Args:
+            tags (list): Tags such as client:<id>, membership:<id> or package:<id>
+        Returns:
+            int: Number of keys deleted
+        """
+        if not tags:
+            return 0
+        cache = frappe.cache()
+        tag_keys = [cache.make_key(self.get_tag_key(tag)) for tag in tags]
+        deleted = cache.eval(INVALIDATE_TAGS_SCRIPT, len(tag_keys), *tag_keys)
+
+        # Keep this request's local cache consistent with Redis
+        local_cache = getattr(frappe.local, "cache", None)
+        if local_cache is not None:
+            for key in deleted:
+                local_cache.pop(key.decode() if isinstance(key, bytes) else key, None)
+        return len(deleted)
+
+    def register_library_dependencies(self, membership_id: str, references: Dict[str, Any]) -> None:
+        """Add a membership to the dependents of every food and exercise in its payload"""
+        cache = frappe.cache()
+        pipeline = cache.pipeline()
+        for item_type, section in (("Exercise", "exercises"), ("Food", "foods")):
+            for item_id in references.get(section) or {}:
+                key = cache.make_key(self.get_library_dependents_key(item_type, item_id))
+                pipeline.sadd(key, membership_id)
+                pipeline.expire(key, self.MEMBERSHIP_CACHE_TIMEOUT)
+        pipeline.execute()
+
+    def invalidate_library_dependents(self, item_type: str, item_id: str) -> List[str]:
+        """
+        Invalidate the cached payloads that embed a library item
+        Args:
+            item_type (str): "Exercise" or "Food"
+            item_id (str): Name of the edited item
+        Returns:
+            list: Memberships whose payload was invalidated
+        """
+        dependents_key = self.get_library_dependents_key(item_type, item_id)
+        memberships = [
+            name.decode() if isinstance(name, bytes) else name
+            for name in frappe.cache().smembers(dependents_key)
+        ]
+        keys = [dependents_key] + [
+            key
+            for membership in memberships
+            for key in (self.get_membership_cache_key(membership), self.get_plans_version_key(membership))
+        ]
+        frappe.cache().delete_value(keys)
+        return memberships
+
+    def get_library_generation(self) -> int:
+        """Library generation counter, read from Redis once per request"""
+        generation = getattr(frappe.local, "ptrainer_library_generation", None)
+        if generation is None:
+            value = frappe.cache().get(frappe.cache().make_key(LIBRARY_GENERATION_KEY))
+            generation = int(value) if value else 0
+            frappe.local.ptrainer_library_generation = generation
+        return generation
+
+    def get_local_library_cache(self) -> LocalLRUCache:
+        """This worker's library LRU, emptied when another worker edited the library"""
+        generation = self.get_library_generation()
+        state = _local_library_caches.get(frappe.local.site)
+        if not state or state['generation'] != generation:
+            state = {'generation': generation, 'lru': LocalLRUCache(LOCAL_LIBRARY_CACHE_SIZE)}
+            _local_library_caches[frappe.local.site] = state
+        return state['lru']
 
     def get_cached_library_item(self, item_type: str, item_id: str) -> Optional[Dict[str, Any]]:
-        """Get cached library item (food/exercise)"""
+        """Get cached library item (food/exercise), from worker memory first and Redis second"""
         cache_key = self.get_library_cache_key(item_type, item_id)
-        return frappe.cache().get_value(cache_key)
+        local_cache = self.get_local_library_cache()
+
+        data = local_cache.get(cache_key)
+        if data is not None:
+            LIBRARY_CACHE_STATS['local_hits'] += 1
+            metrics.incr('ptrainer_library_lookups_total', {'type': item_type, 'tier': 'local'})
+            return data
+        LIBRARY_CACHE_STATS['local_misses'] += 1
+
+        data = frappe.cache().get_value(cache_key)
+        if data is not None:
+            LIBRARY_CACHE_STATS['redis_hits'] += 1
+            local_cache.set(cache_key, data)
+        else:
+            LIBRARY_CACHE_STATS['redis_misses'] += 1
+        metrics.incr('ptrainer_library_lookups_total', {'type': item_type, 'tier': 'redis' if data is not None else 'miss'})
+        return data
 
     def set_cached_library_item(self, item_type: str, item_id: str, data: Dict[str, Any]) -> None:
         """Cache library item with longer timeout"""
@@ -116,6 +366,29 @@ class MembershipCache:
             data,
             expires_in_sec=self.LIBRARY_CACHE_TIMEOUT
         )
+        self.get_local_library_cache().set(cache_key, data)
+
+    def invalidate_library_item(self, item_type: str, item_id: str) -> None:
+        """Drop a library item from Redis and make every worker drop its local copies"""
+        cache_key = self.get_library_cache_key(item_type, item_id)
+        frappe.cache().delete_value(cache_key)
+
+        generation = frappe.cache().incr(frappe.cache().make_key(LIBRARY_GENERATION_KEY))
+        frappe.local.ptrainer_library_generation = int(generation)
+        _local_library_caches.pop(frappe.local.site, None)
+
+    def touch_membership(self, membership_id: str) -> None:
+        """Record when a membership was last requested, used to prioritise cache warm-up"""
+        frappe.cache().zadd(frappe.cache().make_key(MEMBERSHIP_ACCESS_KEY), {membership_id: time.time()})
+
+    def get_recently_accessed_memberships(self) -> Dict[str, float]:
+        """Membership ids mapped to their last access time"""
+        return {
+            (name.decode() if isinstance(name, bytes) else name): score
+            for name, score in frappe.cache().zrange(
+                frappe.cache().make_key(MEMBERSHIP_ACCESS_KEY), 0, -1, withscores=True
+            )
+        }
 
     def invalidate_membership_cache(self, membership_id: str) -> None:
         """Invalidate membership related cache"""
@@ -125,13 +398,15 @@ class MembershipCache:
 
     def invalidate_client_caches(self, client_id: str) -> None:
         """Invalidate all membership caches for a client"""
-        memberships = frappe.get_all(
-            "Membership",
-            filters={"client": client_id},
-            fields=["name"]
-        )
-        for membership in memberships:
-            self.invalidate_membership_cache(membership.name)
+        self.invalidate_clients_caches([client_id])
+
+    def invalidate_clients_caches(self, client_ids: List[str]) -> None:
+        """Invalidate all membership caches for many clients in one round trip"""
+        self.invalidate_tags([f"client:{client_id}" for client_id in client_ids])
+
+    def invalidate_package_caches(self, package: str) -> None:
+        """Invalidate membership caches of every membership on a package"""
+        self.invalidate_tags([f"package:{package}"])
 
 def extract_base_nutrition(food_doc: Any, nutrient_mappings: Dict[str, List[str]]) -> Optional[Dict[str, NutritionFact]]:
     """Extract base nutrition facts (per 100g) from food document"""
@@ -212,6 +487,13 @@ def process_food_reference_data_cached(food_id: str) -> Dict[str, Any]:
         return cached_data
 
     food_doc = frappe.get_doc("Food", food_id)
+    processed_data = process_food_reference_data(food_doc)
+    cache.set_cached_library_item("Food", food_id, processed_data)
+    
+    return processed_data
+
+def process_food_reference_data(food_doc: Any) -> Dict[str, Any]:
+    """Process food data for reference"""
     base_nutrition = extract_base_nutrition(food_doc, get_nutrient_mappings())
     processed_data = {
         'title': food_doc.title,
@@ -221,8 +503,6 @@ def process_food_reference_data_cached(food_id: str) -> Dict[str, Any]:
     }
     if base_nutrition:
         processed_data['nutrition_per_100g'] = base_nutrition
-    cache.set_cached_library_item("Food", food_id, processed_data)
-    
     return processed_data
 
 def process_food_instance(food_item: Any, food_reference_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -238,25 +518,14 @@ def process_food_instance(food_item: Any, food_reference_data: Dict[str, Any]) -
         'nutrition': nutrition
     }
 
-def process_exercise_performance(performance_docs: List[Any]) -> Dict[str, List[Dict[str, Any]]]:
-    """Process exercise performance data into a dictionary"""
-    performance_data = {}
-    
-    for doc in performance_docs:
-        entry = {
-            'weight': doc.weight,
-            'reps': doc.reps,
-            'date': doc.date
-        }
-        
-        if doc.exercise not in performance_data:
-            performance_data[doc.exercise] = []
-        
-        performance_data[doc.exercise].append(entry)
-    
-    return performance_data
+def process_exercise_performance(performance_docs: List[Any]) -> Dict[str, Dict[str, Any]]:
+    """Process exercise performance logs into columnar series per exercise"""
+    return {
+        exercise: series_for_response(series)
+        for exercise, series in build_performance_series(performance_docs).items()
+    }
 
-def process_exercise_instance(exercise_item: Any, performance_data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+def process_exercise_instance(exercise_item: Any, performance_data: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
     """Process exercise instance data with performance references"""
     return {
         'ref': exercise_item.exercise,
@@ -265,7 +534,7 @@ def process_exercise_instance(exercise_item: Any, performance_data: Dict[str, Li
         'rest': exercise_item.rest,
     }
 
-def process_day_exercises(exercises: List[Any], performance_data: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+def process_day_exercises(exercises: List[Any], performance_data: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Process exercises for a day with supersets handling and performance data"""
     processed_exercises = []
     current_superset = []
@@ -307,6 +576,65 @@ def calculate_daily_totals(foods: List[Dict[str, Any]]) -> DailyTotals:
     
     return {n: {'value': round(t['value'], 1), 'unit': t['unit']} for n, t in totals.items()}
 
+class MuscleVolume:
+    """Set and rep volume per muscle group, accumulated in arrays indexed by muscle id"""
+
+    def __init__(self):
+        size = len(MUSCLE_GROUPS)
+        self.primary_sets = [0] * size
+        self.primary_reps = [0] * size
+        self.secondary_sets = [0] * size
+        self.secondary_reps = [0] * size
+
+    def add_exercise(self, exercise_ref: Optional[Dict[str, Any]], sets: Any, reps: Any) -> None:
+        """Add an exercise instance to its primary and secondary muscles"""
+        if not exercise_ref:
+            return
+        sets = int(sets or 0)
+        total_reps = sets * int(reps or 0)
+
+        muscle_id = MUSCLE_IDS.get(exercise_ref.get('primary_muscle'))
+        if muscle_id is not None:
+            self.primary_sets[muscle_id] += sets
+            self.primary_reps[muscle_id] += total_reps
+
+        for muscle in exercise_ref.get('secondary_muscles') or []:
+            muscle_id = MUSCLE_IDS.get(muscle['muscle'])
+            if muscle_id is not None:
+                self.secondary_sets[muscle_id] += sets
+                self.secondary_reps[muscle_id] += total_reps
+
+    def merge(self, other: 'MuscleVolume') -> None:
+        """Add another accumulator into this one"""
+        for mine, theirs in (
+            (self.primary_sets, other.primary_sets),
+            (self.primary_reps, other.primary_reps),
+            (self.secondary_sets, other.secondary_sets),
+            (self.secondary_reps, other.secondary_reps),
+        ):
+            for i, value in enumerate(theirs):
+                mine[i] += value
+
+    def as_dict(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Non-zero volume keyed by muscle name"""
+        return {
+            'primary': {
+                muscle: {'sets': self.primary_sets[i], 'reps': self.primary_reps[i]}
+                for i, muscle in enumerate(MUSCLE_GROUPS) if self.primary_sets[i]
+            },
+            'secondary': {
+                muscle: {'sets': self.secondary_sets[i], 'reps': self.secondary_reps[i]}
+                for i, muscle in enumerate(MUSCLE_GROUPS) if self.secondary_sets[i]
+            }
+        }
+
+def calculate_day_volume(exercises: List[Any], exercise_references: Dict[str, Any]) -> MuscleVolume:
+    """Calculate muscle volume for the exercises of a day"""
+    volume = MuscleVolume()
+    for exercise in exercises:
+        volume.add_exercise(exercise_references.get(exercise.exercise), exercise.sets, exercise.reps)
+    return volume
+
 def process_plan_data(plan_doc: Any) -> Dict[str, Any]:
     """Process plan data with optimized structure"""
     return {
@@ -334,7 +662,7 @@ def process_plan_day(
     day: int,
     food_references: Dict[str, Any],
     exercise_references: Dict[str, Any],
-    performance_data: Dict[str, List[Dict[str, Any]]]
+    performance_data: Dict[str, Dict[str, Any]]
 ) -> Dict[str, Any]:
     """Process a single day of a plan efficiently with performance data"""
     day_exercises = plan_doc.get(f"d{day}_e", [])
@@ -348,7 +676,8 @@ def process_plan_day(
     return {
         'exercises': process_day_exercises(day_exercises, performance_data),
         'foods': processed_foods,
-        'totals': calculate_daily_totals(processed_foods)
+        'totals': calculate_daily_totals(processed_foods),
+        'volume': calculate_day_volume(day_exercises, exercise_references)
     }
 
 def process_plans_batch(plan_docs: List[Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
@@ -372,98 +701,401 @@ def process_plans_batch(plan_docs: List[Any]) -> Tuple[Dict[str, Any], List[Dict
     }
 
     # Process reference data with caching
-    for exercise_name in all_exercises:
-        reference_data['exercises'][exercise_name] = process_exercise_data_cached(exercise_name)
-    
-    for food_id in all_foods:
-        reference_data['foods'][food_id] = process_food_reference_data_cached(food_id)
-
-    # Process exercise performance data
-    performance_docs = frappe.get_all(
-        "Performance Log",
-        filters={"exercise": ["in", list(all_exercises)]},
-        fields=["exercise", "weight", "reps", "date"]
-    )
-    for doc in performance_docs:
-        if doc.exercise not in reference_data['performance']:
-            reference_data['performance'][doc.exercise] = []
-        reference_data['performance'][doc.exercise].append({
-            'weight': doc.weight,
-            'reps': doc.reps,
-            'date': doc.date
-        })
+    with profiling.stage('library'):
+        for exercise_name in all_exercises:
+            reference_data['exercises'][exercise_name] = process_exercise_data_cached(exercise_name)
+        
+        for food_id in all_foods:
+            reference_data['foods'][food_id] = process_food_reference_data_cached(food_id)
 
-    # Process plans efficiently
-    for plan_doc in plan_docs:
-        plan_data = process_plan_data(plan_doc)
-        plan_data['days'] = {
-            f"day_{day}": process_plan_day(
-                plan_doc, 
-                day, 
-                reference_data['foods'],
-                reference_data['exercises'],
-                reference_data['performance']
-            )
+    # Exercise performance from the client's stored series
+    with profiling.stage('performance'):
+        for client_id in {plan.client for plan in plan_docs if plan.client}:
+            for exercise_name, series in get_performance_series(client_id, all_exercises).items():
+                reference_data['performance'][exercise_name] = series_for_response(series)
+
+    # Next targets for every exercise, planned reps taken from its first occurrence
+    with profiling.stage('suggestions'):
+        suggestions = get_progression_suggestions(
+            (plan.client, exercise.exercise, exercise.reps)
+            for plan in plan_docs
             for day in range(1, 8)
-        }
-        processed_plans.append(plan_data)
+            for exercise in plan.get(f"d{day}_e", [])
+        )
+    reference_data['suggestions'] = {
+        exercise_name: suggestion
+        for client_suggestions in suggestions.values()
+        for exercise_name, suggestion in client_suggestions.items()
+    }
+
+    # Process plans efficiently
+    with profiling.stage('plan_days'):
+        for plan_doc in plan_docs:
+            plan_data = process_plan_data(plan_doc)
+            plan_data['days'] = {
+                f"day_{day}": process_plan_day(
+                    plan_doc, 
+                    day, 
+                    reference_data['foods'],
+                    reference_data['exercises'],
+                    reference_data['performance']
+                )
+                for day in range(1, 8)
+            }
+
+            # Roll day volume up to the week
+            week_volume = MuscleVolume()
+            for day_data in plan_data['days'].values():
+                week_volume.merge(day_data['volume'])
+                day_data['volume'] = day_data['volume'].as_dict()
+            plan_data['volume'] = week_volume.as_dict()
+
+            processed_plans.append(plan_data)
 
     return reference_data, processed_plans
 
+@frappe.whitelist()
+def get_volume_balance() -> Dict[str, Any]:
+    """Weekly muscle volume of every active client's current plan, with totals across clients"""
+    frappe.has_permission("Plan", "read", throw=True)
+    active_memberships = frappe.get_all("Membership", filters={"active": 1}, pluck="name")
+    if not active_memberships:
+        return {'clients': {}, 'totals': MuscleVolume().as_dict(), 'untrained': list(MUSCLE_GROUPS)}
+
+    # Plan.status is only set on insert, pick the current plan by its dates
+    today = nowdate()
+    plans = frappe.get_all(
+        "Plan",
+        filters={"membership": ["in", active_memberships], "start": ["<=", today], "end": [">=", today]},
+        fields=["name", "client"]
+    )
+    plan_clients = {plan.name: plan.client for plan in plans}
+
+    exercise_rows = frappe.get_all(
+        "Exercises",
+        filters={"parenttype": "Plan", "parent": ["in", list(plan_clients) or [""]]},
+        fields=["parent", "exercise", "sets", "reps"]
+    )
+
+    # Muscle references for every exercise used, in two queries
+    exercise_names = list({row.exercise for row in exercise_rows if row.exercise}) or [""]
+    exercise_references = {
+        e.name: {'primary_muscle': e.primary_muscle, 'secondary_muscles': []}
+        for e in frappe.get_all("Exercise", filters={"name": ["in", exercise_names]}, fields=["name", "primary_muscle"])
+    }
+    for muscle in frappe.get_all(
+        "Muscles",
+        filters={"parenttype": "Exercise", "parent": ["in", exercise_names]},
+        fields=["parent", "muscle"]
+    ):
+        if muscle.parent in exercise_references:
+            exercise_references[muscle.parent]['secondary_muscles'].append({'muscle': muscle.muscle})
+
+    client_volumes: Dict[str, MuscleVolume] = {}
+    for row in exercise_rows:
+        volume = client_volumes.setdefault(plan_clients[row.parent], MuscleVolume())
+        volume.add_exercise(exercise_references.get(row.exercise), row.sets, row.reps)
+
+    totals = MuscleVolume()
+    for volume in client_volumes.values():
+        totals.merge(volume)
+
+    return {
+        'clients': {client: volume.as_dict() for client, volume in client_volumes.items()},
+        'totals': totals.as_dict(),
+        'untrained': [muscle for i, muscle in enumerate(MUSCLE_GROUPS) if not totals.primary_sets[i]]
+    }
+
+def build_membership_payload(membership_doc: Any, client_doc: Any, plan_docs: List[Any],
+                             sections: Any = MEMBERSHIP_SECTIONS) -> Dict[str, Any]:
+    """
+    Build the membership payload from its loaded membership, client summary and plans
+    Only the requested sections are built, plans and references are processed together
+    """
+    payload = {}
+    if 'membership' in sections:
+        payload['membership'] = {
+            'name': membership_doc.name,
+            'package': membership_doc.package,
+            'client': membership_doc.client,
+            'start': membership_doc.start,
+            'end': membership_doc.end,
+            'active': membership_doc.active,
+        }
+
+    if 'client' in sections:
+        # Smoothed, downsampled weight history
+        with metrics.timer('ptrainer_membership_rebuild_seconds', stage='weight'), profiling.stage('weight'):
+            weight_trend = get_weight_trend(client_doc.name)
+            weight_history = downsample_trend(weight_trend)
+        payload['client'] = {
+            **{k: v for k, v in client_doc.items() if k not in {'target_proteins', 'target_carbs', 'target_fats', 'target_energy', 'target_water'}},
+            'current_weight': weight_trend['summary']['current_weight'] if weight_trend['summary'] else None,
+            'weight': weight_history['daily'],
+            'weight_history': weight_history['weekly'],
+            'weight_trend': weight_trend['summary']
+        }
+
+    if 'plans' in sections or 'references' in sections:
+        # Process plans in batch, with performance and progression suggestions
+        with metrics.timer('ptrainer_membership_rebuild_seconds', stage='process'), profiling.stage('process'):
+            reference_data, processed_plans = process_plans_batch(plan_docs)
+        if 'plans' in sections:
+            payload['plans'] = processed_plans
+        if 'references' in sections:
+            payload['references'] = reference_data
+
+    return payload
+
 @frappe.whitelist(allow_guest=True)
 def get_membership(membership: str) -> Dict[str, Any]:
     """Get comprehensive membership information with optimized data structure"""
+    with profiling.profile("get_membership", membership):
+        return load_membership(membership)
+
+def load_membership(membership: str, touch: bool = True) -> Dict[str, Any]:
+    """
+    Build or fetch the cached membership payload
+    Args:
+        membership (str): Membership ID
+        touch (bool): Record the access for warm-up ordering, off for warm-up and rebuilds
+    """
+    started = time.perf_counter()
     try:
         cache = MembershipCache()
         
         # Try to get cached membership data
-        cached_data = cache.get_cached_membership_data(membership)
+        with profiling.stage('cache_read'):
+            cached_data = cache.get_cached_membership_data(membership)
         if cached_data:
+            if touch:
+                cache.touch_membership(membership)
+            metrics.incr('ptrainer_membership_requests_total', {'result': 'cached'})
             return cached_data
 
         # Fetch and validate core documents
-        membership_doc = frappe.get_doc("Membership", membership)
-        if not membership_doc.active:
-            return {"message": "Membership is not active."}
-
-        client_doc = frappe.get_doc("Client", membership_doc.client)
-        if not client_doc.enabled:
-            return {"message": "Client is disabled."}
-
-        # Get all plans
-        plans = frappe.get_all(
-            "Plan",
-            filters={"membership": membership, "status": ["!=", "Scheduledx"]},
-            fields=["*"]
-        )
-        plan_docs = [frappe.get_doc("Plan", plan.name) for plan in plans]
-
-        # Process plans in batch
-        reference_data, processed_plans = process_plans_batch(plan_docs)
-
-        # Build response
-        response_data = {
-            'membership': {
-                'name': membership_doc.name,
-                'package': membership_doc.package,
-                'client': membership_doc.client,
-                'start': membership_doc.start,
-                'end': membership_doc.end,
-                'active': membership_doc.active,
-            },
-            'client': {
-                **{k: v for k, v in client_doc.as_dict().items() if k not in {'exercise_performance', 'target_proteins', 'target_carbs', 'target_fats', 'target_energy', 'target_water'}},
-                'current_weight': client_doc.weight[-1].weight if client_doc.weight else None,
-                'weight': [{'weight': w.weight, 'date': w.date} for w in client_doc.weight]
-            },
-            'plans': processed_plans,
-            'references': reference_data
-        }
+        with metrics.timer('ptrainer_membership_rebuild_seconds', stage='load'):
+            with profiling.stage('membership'):
+                membership_doc = frappe.get_doc("Membership", membership)
+                if touch:
+                    cache.touch_membership(membership)
+            if not membership_doc.active:
+                metrics.incr('ptrainer_membership_requests_total', {'result': 'inactive'})
+                return {"message": "Membership is not active."}
+
+            with profiling.stage('client'):
+                client_doc = get_client_summary(membership_doc.client)
+            if not client_doc.enabled:
+                metrics.incr('ptrainer_membership_requests_total', {'result': 'disabled'})
+                return {"message": "Client is disabled."}
+
+            # Get all plans
+            with profiling.stage('plans'):
+                plans = frappe.get_all(
+                    "Plan",
+                    filters={"membership": membership, "status": ["!=", "Scheduledx"]},
+                    fields=["*"]
+                )
+                plan_docs = [frappe.get_doc("Plan", plan.name) for plan in plans]
+
+        response_data = build_membership_payload(membership_doc, client_doc, plan_docs)
 
         # Cache the response
-        cache.set_cached_membership_data(membership, response_data)
+        with metrics.timer('ptrainer_membership_rebuild_seconds', stage='cache_write'), profiling.stage('cache_write'):
+            cache.set_cached_membership_data(membership, response_data)
+
+        metrics.observe('ptrainer_membership_rebuild_seconds', time.perf_counter() - started, {'stage': 'total'})
+        metrics.observe('ptrainer_membership_payload_bytes', len(pickle.dumps(response_data)), buckets=metrics.SIZE_BUCKETS)
+        metrics.incr('ptrainer_membership_requests_total', {'result': 'rebuilt'})
         
         return response_data
     except Exception as e:
+        metrics.incr('ptrainer_membership_errors_total', {'error': type(e).__name__})
+        metrics.incr('ptrainer_membership_requests_total', {'result': 'error'})
         frappe.log_error(f"Error in get_membership: {str(e)}")
-        return {"message": f"An error occurred: {str(e)}"}
\ No newline at end of file
+        return {"message": f"An error occurred: {str(e)}"}
+
+def load_exercise_references(names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Processed exercise data for the given exercises, or every enabled one, with two queries"""
+    filters = {"name": ["in", names]} if names is not None else {"enabled": 1}
+    exercises = frappe.get_all(
+        "Exercise",
+        filters=filters,
+        fields=["name", "category", "equipment", "force", "mechanic", "level", "primary_muscle",
+                "thumbnail", "starting", "ending", "video", "instructions"]
+    )
+    muscles = {}
+    for row in frappe.get_all(
+        "Muscles",
+        filters={"parenttype": "Exercise", "parent": ["in", [e.name for e in exercises] or [""]]},
+        fields=["parent", "muscle"],
+        order_by="parent asc, idx asc"
+    ):
+        muscles.setdefault(row.parent, []).append(row)
+
+    references = {}
+    for exercise in exercises:
+        exercise.secondary_muscles = muscles.get(exercise.name, [])
+        references[exercise.name] = process_exercise_data(exercise)
+    return references
+
+def load_food_references(names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Processed food data for the given foods, or every enabled one, with two queries"""
+    filters = {"name": ["in", names]} if names is not None else {"enabled": 1}
+    foods = frappe.get_all("Food", filters=filters, fields=["name", "title", "image", "category", "description"])
+    facts = {}
+    for row in frappe.get_all(
+        "Nutritional Facts",
+        filters={"parenttype": "Food", "parent": ["in", [f.name for f in foods] or [""]]},
+        fields=["parent", "nutrient", "value", "unit"],
+        order_by="parent asc, idx asc"
+    ):
+        facts.setdefault(row.parent, []).append(row)
+
+    references = {}
+    for food in foods:
+        food.nutritional_facts = facts.get(food.name, [])
+        references[food.name] = process_food_reference_data(food)
+    return references
+
+def prefetch_library_items(exercise_names: Set[str], food_names: Set[str]) -> None:
+    """Load library items missing from the cache with set-based queries"""
+    cache = MembershipCache()
+    for item_type, names, loader in (
+        ("Exercise", exercise_names, load_exercise_references),
+        ("Food", food_names, load_food_references),
+    ):
+        missing = [name for name in names if name and cache.get_cached_library_item(item_type, name) is None]
+        if missing:
+            for name, data in loader(missing).items():
+                cache.set_cached_library_item(item_type, name, data)
+
+def load_plans_batch(membership_ids: List[str]) -> Dict[str, List[Any]]:
+    """Plans of many memberships with their day tables, in three queries"""
+    plans = frappe.get_all(
+        "Plan",
+        filters={"membership": ["in", membership_ids], "status": ["!=", "Scheduledx"]},
+        fields=["*"]
+    )
+    plans_by_name = {}
+    for plan in plans:
+        for day in range(1, 8):
+            plan[f"d{day}_e"] = []
+            plan[f"d{day}_f"] = []
+        plans_by_name[plan.name] = plan
+
+    for child_doctype, fields in (
+        ("Exercises", ["super", "exercise", "sets", "reps", "rest"]),
+        ("Foods", ["meal", "food", "amount"]),
+    ):
+        for row in frappe.get_all(
+            child_doctype,
+            filters={"parenttype": "Plan", "parent": ["in", list(plans_by_name) or [""]]},
+            fields=["parent", "parentfield", "idx", *fields],
+            order_by="parent asc, parentfield asc, idx asc"
+        ):
+            plan = plans_by_name.get(row.parent)
+            if plan is not None and row.parentfield in plan:
+                plan[row.parentfield].append(row)
+
+    plans_by_membership = {}
+    for plan in plans:
+        plans_by_membership.setdefault(plan.membership, []).append(plan)
+    return plans_by_membership
+
+def split_library_references(payload: Dict[str, Any], shared: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Move a payload's exercise and food references into the shared dictionary"""
+    references = dict(payload.get('references') or {})
+    for section in ('exercises', 'foods'):
+        shared[section].update(references.pop(section, None) or {})
+    return {**payload, 'references': references}
+
+@frappe.whitelist()
+def get_memberships(names: Any, sections: Any = None) -> Dict[str, Any]:
+    """
+    Payloads of many memberships for trainer dashboards, built with shared set-based queries
+    Args:
+        names (list): Membership names
+        sections (list): Payload sections to return, any of MEMBERSHIP_SECTIONS, all by default.
+            Sections that aren't requested are not loaded, and partial payloads are not cached
+    Returns:
+        dict: 'memberships' keyed by name, each without library references, and the
+              deduplicated 'references' (exercises and foods) shared by all of them
+    """
+    frappe.has_permission("Membership", "read", throw=True)
+    names = frappe.parse_json(names) if isinstance(names, str) else names
+    sections = frappe.parse_json(sections) if isinstance(sections, str) else sections
+    sections = set(sections or MEMBERSHIP_SECTIONS)
+    names = list(dict.fromkeys(names or []))
+    complete = sections.issuperset(MEMBERSHIP_SECTIONS)
+    needs_plans = bool(sections & {'plans', 'references'})
+
+    cache = MembershipCache()
+    shared = {'exercises': {}, 'foods': {}}
+    payloads = {}
+
+    # Reuse cached payloads that are still current
+    versions = cache.get_membership_versions(names) if names else {}
+    for name in names:
+        if name not in versions:
+            payloads[name] = {"message": "Membership not found."}
+            continue
+        cached_data = cache.get_cached_membership_data(name, versions[name])
+        if cached_data:
+            payloads[name] = split_library_references(cached_data, shared)
+
+    # Build the rest together
+    missing = [name for name in names if name not in payloads]
+    if missing:
+        memberships = frappe.get_all(
+            "Membership",
+            filters={"name": ["in", missing]},
+            fields=["name", "package", "client", "start", "end", "active"]
+        )
+        clients = get_client_summaries([m.client for m in memberships])
+        plans_by_membership = load_plans_batch([m.name for m in memberships]) if needs_plans else {}
+
+        if plans_by_membership:
+            prefetch_library_items(
+                {row.exercise for plans in plans_by_membership.values() for plan in plans
+                 for day in range(1, 8) for row in plan[f"d{day}_e"]},
+                {row.food for plans in plans_by_membership.values() for plan in plans
+                 for day in range(1, 8) for row in plan[f"d{day}_f"]}
+            )
+
+        for membership_doc in memberships:
+            client_doc = clients.get(membership_doc.client)
+            if not membership_doc.active:
+                payloads[membership_doc.name] = {"message": "Membership is not active."}
+            elif not client_doc or not client_doc.enabled:
+                payloads[membership_doc.name] = {"message": "Client is disabled."}
+            else:
+                try:
+                    payload = build_membership_payload(
+                        membership_doc, client_doc, plans_by_membership.get(membership_doc.name, []), sections
+                    )
+                    if complete:
+                        cache.set_cached_membership_data(membership_doc.name, payload, versions.get(membership_doc.name))
+                    payloads[membership_doc.name] = split_library_references(payload, shared)
+                except Exception as e:
+                    frappe.log_error(f"Error in get_memberships for {membership_doc.name}: {str(e)}")
+                    payloads[membership_doc.name] = {"message": f"An error occurred: {str(e)}"}
+
+    return {
+        'memberships': {
+            name: {key: value for key, value in payload.items() if key in sections or key == 'message'}
+            for name, payload in payloads.items()
+        },
+        'references': shared
+    }
+
+@frappe.whitelist()
+def get_library_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of this worker's library cache tiers"""
+    frappe.only_for("System Manager")
+    state = _local_library_caches.get(frappe.local.site)
+    return {
+        **LIBRARY_CACHE_STATS,
+        'local_size': len(state['lru'].items) if state else 0,
+        'local_maxsize': LOCAL_LIBRARY_CACHE_SIZE
+    }
\ No newline at end of file
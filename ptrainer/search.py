@@ -0,0 +1,260 @@
+from typing import Dict, List, Optional, Any, Iterable, Set
+from collections import defaultdict
+import json
+import re
+import time
+import frappe
+from frappe.desk.search import validate_and_sanitize_search_inputs
+
+# Constants
+MAX_PREFIX_LENGTH = 12
+MAX_LOG_LENGTH = 1000  # pending changes before workers do a full rebuild instead
+MAX_RECENT_ITEMS = 200
+RECENT_BOOST = 1.5
+ALIAS_WEIGHT = 0.5
+MIN_TRIGRAM_SCORE = 0.3
+
+# Fields indexed per doctype: title, aliases and the description shown in results
+SEARCH_SOURCES = {
+    "Food": {
+        "fields": ["name", "title", "description", "category", "enabled"],
+        "title": lambda row: row.title or row.name,
+        "aliases": lambda row: [row.description, row.category],
+        "description": lambda row: ", ".join(filter(None, [row.title, row.category])),
+    },
+    "Exercise": {
+        "fields": ["name", "exercise", "primary_muscle", "equipment", "enabled"],
+        "title": lambda row: row.exercise or row.name,
+        "aliases": lambda row: [row.primary_muscle, row.equipment],
+        "description": lambda row: ", ".join(filter(None, [row.primary_muscle, row.equipment])),
+    },
+}
+
+# Per-worker indexes keyed by (site, doctype)
+_search_indexes: Dict[tuple, Dict[str, Any]] = {}
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase alphanumeric tokens of a string"""
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+def get_trigrams(token: str) -> Set[str]:
+    """Trigrams of a token padded so short tokens still produce some"""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class LinkSearchIndex:
+    """Prefix and trigram index over titles and aliases of a library doctype"""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.prefixes: Dict[str, Set[str]] = defaultdict(set)
+        self.trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, name: str, title: str, aliases: Iterable[Optional[str]] = (),
+            description: Optional[str] = None, enabled: int = 1) -> None:
+        """Add or replace an entry"""
+        self.remove(name)
+
+        title_tokens = tokenize(title)
+        alias_tokens = [t for alias in aliases for t in tokenize(alias) if t not in title_tokens]
+        self.entries[name] = {
+            'title': title,
+            'title_tokens': title_tokens,
+            'alias_tokens': alias_tokens,
+            'description': description,
+            'enabled': enabled,
+        }
+
+        for token in {*title_tokens, *alias_tokens}:
+            for i in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                self.prefixes[token[:i]].add(name)
+            for trigram in get_trigrams(token):
+                self.trigrams[trigram].add(name)
+
+    def remove(self, name: str) -> None:
+        """Remove an entry if present"""
+        entry = self.entries.pop(name, None)
+        if not entry:
+            return
+
+        for token in {*entry['title_tokens'], *entry['alias_tokens']}:
+            for i in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                self.prefixes[token[:i]].discard(name)
+            for trigram in get_trigrams(token):
+                self.trigrams[trigram].discard(name)
+
+    def get_candidates(self, query_tokens: List[str]) -> Set[str]:
+        """Entries sharing a prefix or a trigram with any query token"""
+        candidates = set()
+        for token in query_tokens:
+            candidates |= self.prefixes.get(token[:MAX_PREFIX_LENGTH], set())
+            for trigram in get_trigrams(token):
+                candidates |= self.trigrams.get(trigram, set())
+        return candidates
+
+    def score(self, name: str, query_tokens: List[str]) -> float:
+        """Relevance of an entry: exact > prefix > trigram similarity, title over aliases"""
+        entry = self.entries[name]
+        total = 0.0
+
+        for query_token in query_tokens:
+            query_trigrams = get_trigrams(query_token)
+            best = 0.0
+            for weight, tokens in ((1.0, entry['title_tokens']), (ALIAS_WEIGHT, entry['alias_tokens'])):
+                for token in tokens:
+                    if token == query_token:
+                        match = 3.0
+                    elif token.startswith(query_token):
+                        match = 2.0
+                    else:
+                        token_trigrams = get_trigrams(token)
+                        match = len(query_trigrams & token_trigrams) / len(query_trigrams | token_trigrams)
+                        if match < MIN_TRIGRAM_SCORE:
+                            match = 0.0
+                    best = max(best, match * weight)
+            if not best:
+                return 0.0
+            total += best
+
+        # Titles starting with the query rank first
+        if entry['title_tokens'][:1] and entry['title_tokens'][0].startswith(query_tokens[0]):
+            total += 1.0
+        return total
+
+    def search(self, txt: str, start: int = 0, page_len: int = 20,
+               exclude: Iterable[str] = (), recent: Optional[Dict[str, float]] = None) -> List[str]:
+        """Ranked entry names matching txt"""
+        exclude = set(exclude)
+        recent = recent or {}
+        query_tokens = tokenize(txt)
+
+        if query_tokens:
+            candidates = self.get_candidates(query_tokens)
+        else:
+            candidates = self.entries.keys()
+
+        scored = []
+        for name in candidates:
+            if name in exclude or not self.entries[name]['enabled']:
+                continue
+            relevance = self.score(name, query_tokens) if query_tokens else 0.0
+            if query_tokens and not relevance:
+                continue
+            scored.append((-(relevance + RECENT_BOOST * recent.get(name, 0.0)), self.entries[name]['title'], name))
+
+        scored.sort()
+        return [name for _, _, name in scored[start:start + page_len]]
+
+def get_search_log_key(doctype: str) -> str:
+    return f"link_search_log:{doctype}"
+
+def get_search_epoch_key(doctype: str) -> str:
+    return f"link_search_epoch:{doctype}"
+
+def get_usage_key(doctype: str, user: str) -> str:
+    return f"link_usage:{doctype}:{user}"
+
+def decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+def load_search_rows(doctype: str, names: Optional[List[str]] = None) -> List[Any]:
+    filters = {"name": ["in", names]} if names is not None else {}
+    return frappe.get_all(doctype, filters=filters, fields=SEARCH_SOURCES[doctype]["fields"])
+
+def add_rows_to_index(index: LinkSearchIndex, doctype: str, rows: List[Any]) -> None:
+    source = SEARCH_SOURCES[doctype]
+    for row in rows:
+        index.add(
+            row.name,
+            source["title"](row),
+            source["aliases"](row),
+            source["description"](row),
+            row.enabled
+        )
+
+def get_search_index(doctype: str) -> LinkSearchIndex:
+    """Get this worker's index, applying changes logged by other workers"""
+    cache = frappe.cache()
+    log_key = get_search_log_key(doctype)
+
+    epoch = cache.get_value(get_search_epoch_key(doctype))
+    if not epoch:
+        epoch = frappe.generate_hash(length=10)
+        cache.set_value(get_search_epoch_key(doctype), epoch)
+
+    state = _search_indexes.get((frappe.local.site, doctype))
+    if not state or state['epoch'] != epoch:
+        # Read the log position first so changes made during the build get re-applied
+        offset = cache.llen(log_key)
+        index = LinkSearchIndex()
+        add_rows_to_index(index, doctype, load_search_rows(doctype))
+        state = {'epoch': epoch, 'offset': offset, 'index': index}
+        _search_indexes[(frappe.local.site, doctype)] = state
+        return index
+
+    length = cache.llen(log_key)
+    if length > state['offset']:
+        changed = list({decode(n) for n in cache.lrange(log_key, state['offset'], length - 1)})
+        rows = load_search_rows(doctype, changed)
+        for name in set(changed) - {row.name for row in rows}:
+            state['index'].remove(name)
+        add_rows_to_index(state['index'], doctype, rows)
+        state['offset'] = length
+
+    return state['index']
+
+def update_search_index(doctype: str, name: str) -> None:
+    """Log a changed item so every worker updates its index incrementally"""
+    cache = frappe.cache()
+    log_key = get_search_log_key(doctype)
+
+    if cache.llen(log_key) >= MAX_LOG_LENGTH:
+        # Too many pending changes, let workers rebuild from scratch
+        cache.delete_value(log_key)
+        cache.set_value(get_search_epoch_key(doctype), frappe.generate_hash(length=10))
+    else:
+        cache.rpush(log_key, name)
+
+def record_link_usage(plan_doc: Any) -> None:
+    """Remember foods and exercises the current user just planned"""
+    cache = frappe.cache()
+    now = time.time()
+    used = {
+        "Food": {row.food for day in range(1, 8) for row in plan_doc.get(f"d{day}_f", []) if row.food},
+        "Exercise": {row.exercise for day in range(1, 8) for row in plan_doc.get(f"d{day}_e", []) if row.exercise},
+    }
+
+    for doctype, names in used.items():
+        if not names:
+            continue
+        key = cache.make_key(get_usage_key(doctype, frappe.session.user))
+        cache.zadd(key, {name: now for name in names})
+        cache.zremrangebyrank(key, 0, -(MAX_RECENT_ITEMS + 1))
+
+def get_recent_usage(doctype: str) -> Dict[str, float]:
+    """Most recently used items of the current user mapped to a 0-1 recency weight"""
+    cache = frappe.cache()
+    key = cache.make_key(get_usage_key(doctype, frappe.session.user))
+    recent = [decode(name) for name in cache.zrevrange(key, 0, MAX_RECENT_ITEMS - 1)]
+    return {name: 1 - (rank / len(recent)) for rank, name in enumerate(recent)}
+
+def search_library(doctype: str, txt: str, start: int, page_len: int, exclude: Iterable[str] = ()) -> List[tuple]:
+    index = get_search_index(doctype)
+    names = index.search(txt, start, page_len, exclude, get_recent_usage(doctype))
+    return [(name, index.entries[name]['description']) for name in names]
+
+@frappe.whitelist()
+@validate_and_sanitize_search_inputs
+def search_food(doctype, txt, searchfield, start, page_len, filters):
+    """Link search for Food ranked by relevance and recent use, skipping blocked foods"""
+    filters = json.loads(filters) if isinstance(filters, str) else (filters or {})
+    blocked = filters.get("blocked_foods") or []
+    if isinstance(blocked, str):
+        blocked = [food.strip() for food in blocked.split(",")]
+    return search_library("Food", txt, start, page_len, blocked)
+
+@frappe.whitelist()
+@validate_and_sanitize_search_inputs
+def search_exercise(doctype, txt, searchfield, start, page_len, filters):
+    """Link search for Exercise ranked by relevance and recent use"""
+    return search_library("Exercise", txt, start, page_len)
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import frappe
+from ptrainer.ptrainer_methods import (
+    MembershipCache, load_exercise_references, load_food_references, load_membership
+)
+
+# Constants
+DEFAULT_CONCURRENCY = 4
+BATCH_SIZE = 25  # memberships rebuilt per worker task
+
+def preload_library() -> Dict[str, int]:
+    """Load every enabled Exercise and Food into the library cache with four queries"""
+    cache = MembershipCache()
+    counts = {}
+    for item_type, key, loader in (
+        ("Exercise", 'exercises', load_exercise_references),
+        ("Food", 'foods', load_food_references),
+    ):
+        references = loader()
+        for name, data in references.items():
+            cache.set_cached_library_item(item_type, name, data)
+        counts[key] = len(references)
+    return counts
+
+def get_warmup_order() -> List[str]:
+    """Active memberships, most recently accessed first"""
+    accessed = MembershipCache().get_recently_accessed_memberships()
+    memberships = frappe.get_all("Membership", filters={"active": 1}, pluck="name")
+    return sorted(memberships, key=lambda name: accessed.get(name, 0), reverse=True)
+
+def warm_membership_batch(site: str, memberships: List[str]) -> Dict[str, int]:
+    """Rebuild cached payloads for a batch of memberships on its own connection"""
+    frappe.init(site=site)
+    frappe.connect()
+    frappe.set_user("Administrator")
+    try:
+        errors = 0
+        for membership in memberships:
+            result = load_membership(membership, touch=False)
+            if 'message' in result:
+                errors += 1
+        return {'done': len(memberships), 'errors': errors}
+    finally:
+        frappe.destroy()
+
+def rebuild_memberships(memberships: List[str]) -> None:
+    """Rebuild cached payloads invalidated by a library edit"""
+    for membership in memberships:
+        load_membership(membership, touch=False)
+
+def warm_up_cache(concurrency: int = DEFAULT_CONCURRENCY,
+                  progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Preload the library cache and rebuild membership payloads after a deploy or flush
+    Args:
+        concurrency (int): Memberships rebuilt in parallel
+        progress (callable): Called with (done, total) after each batch
+    Returns:
+        dict: Counts and elapsed seconds
+    """
+    started = time.monotonic()
+    stats = preload_library()
+    frappe.db.commit()
+
+    memberships = get_warmup_order()
+    batches = [memberships[i:i + BATCH_SIZE] for i in range(0, len(memberships), BATCH_SIZE)]
+
+    done = errors = 0
+    site = frappe.local.site
+    with ThreadPoolExecutor(max_workers=max(int(concurrency), 1)) as executor:
+        futures = [executor.submit(warm_membership_batch, site, batch) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                done += result['done']
+                errors += result['errors']
+            except Exception:
+                frappe.log_error("Cache Warm-up Error")
+                errors += 1
+            if progress:
+                progress(done, len(memberships))
+
+    return {
+        **stats,
+        'memberships': done,
+        'errors': errors,
+        'elapsed': round(time.monotonic() - started, 2)
+    }
+
+def warm_up_cache_job(concurrency: int = DEFAULT_CONCURRENCY) -> None:
+    """Background job wrapper that logs progress and the result"""
+    def report(done, total):
+        frappe.publish_progress(done * 100 / (total or 1), title="Warming cache", description=f"{done}/{total}")
+
+    result = warm_up_cache(concurrency, report)
+    frappe.logger("ptrainer").info(f"Cache warm-up completed: {result}")
+
+def after_migrate() -> None:
+    """Warm the cache in the background once a migrate has finished"""
+    frappe.enqueue("ptrainer.warmup.warm_up_cache_job", queue="long", job_id="ptrainer_cache_warmup", deduplicate=True)
+
+def scheduled_warm_up() -> None:
+    """Daily warm-up, enabled from Ptrainer Settings"""
+    if frappe.db.get_single_value("Ptrainer Settings", "warm_cache_daily"):
+        warm_up_cache_job()
+
+@frappe.whitelist()
+def enqueue_warm_up() -> Dict[str, str]:
+    """Queue a cache warm-up from the desk"""
+    frappe.only_for("System Manager")
+    after_migrate()
+    return {"message": "Cache warm-up has been queued."}
@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional, Any, Iterable
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+import frappe
+from frappe.utils import getdate, flt
+
+# Constants
+EMA_DAILY_ALPHA = 0.1  # smoothing per day, applied over the gap between weigh-ins
+DAILY_WINDOW_DAYS = 90  # weigh-ins kept day by day, older ones are bucketed per week
+RATE_WINDOW_DAYS = 28  # window for the weekly rate of change
+
+def get_weight_trend_key(client_id: str) -> str:
+    return f"weight_trend:{client_id}"
+
+def new_trend() -> Dict[str, Any]:
+    """Empty weight series sorted by date, with the smoothed trend per entry"""
+    return {
+        'dates': array('i'),  # date ordinals
+        'weights': array('d'),
+        'ema': array('d'),
+        'summary': None
+    }
+
+def smooth(previous_ema: Optional[float], previous_day: Optional[int], day: int, weight: float) -> float:
+    """Exponential moving average step adjusted for the days since the previous weigh-in"""
+    if previous_ema is None:
+        return weight
+    alpha = 1 - (1 - EMA_DAILY_ALPHA) ** max(day - previous_day, 1)
+    return previous_ema + alpha * (weight - previous_ema)
+
+def recompute_ema(trend: Dict[str, Any], start: int = 0) -> None:
+    """Recompute the trend column from position start onwards"""
+    del trend['ema'][start:]
+    for i in range(start, len(trend['dates'])):
+        previous_ema = trend['ema'][i - 1] if i else None
+        previous_day = trend['dates'][i - 1] if i else None
+        trend['ema'].append(smooth(previous_ema, previous_day, trend['dates'][i], trend['weights'][i]))
+
+def summarize_trend(trend: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Current weight, smoothed trend, last 7-day average and weekly rate of change"""
+    dates, weights, ema = trend['dates'], trend['weights'], trend['ema']
+    if not dates:
+        return None
+
+    last_day = dates[-1]
+    week_start = bisect_left(dates, last_day - 6)
+    week_weights = weights[week_start:]
+
+    rate_start = bisect_left(dates, last_day - RATE_WINDOW_DAYS)
+    span_days = last_day - dates[rate_start]
+    rate = (ema[-1] - ema[rate_start]) / span_days * 7 if span_days else 0.0
+
+    return {
+        'current_weight': weights[-1],
+        'date': date.fromordinal(last_day),
+        'ema': round(ema[-1], 1),
+        'weekly_average': round(sum(week_weights) / len(week_weights), 1),
+        'rate_per_week': round(rate, 2)
+    }
+
+def append_weight(trend: Dict[str, Any], log_date: Any, weight: Any) -> None:
+    """Add a weigh-in, keeping dates sorted and the trend up to date"""
+    day = getdate(log_date).toordinal()
+    weight = flt(weight)
+
+    if not trend['dates'] or day >= trend['dates'][-1]:
+        previous_ema = trend['ema'][-1] if trend['ema'] else None
+        previous_day = trend['dates'][-1] if trend['dates'] else None
+        trend['dates'].append(day)
+        trend['weights'].append(weight)
+        trend['ema'].append(smooth(previous_ema, previous_day, day, weight))
+    else:
+        # Back-dated weigh-in: the trend changes from that point on
+        position = bisect_right(trend['dates'], day)
+        trend['dates'].insert(position, day)
+        trend['weights'].insert(position, weight)
+        recompute_ema(trend, position)
+
+def build_weight_trend(weight_rows: Iterable[Any]) -> Dict[str, Any]:
+    """Build the trend from Weight Log rows"""
+    trend = new_trend()
+    for row in sorted((r for r in weight_rows if r.date), key=lambda r: getdate(r.date)):
+        append_weight(trend, row.date, row.weight)
+    trend['summary'] = summarize_trend(trend)
+    return trend
+
+def downsample_trend(trend: Dict[str, Any], daily_days: int = DAILY_WINDOW_DAYS) -> Dict[str, List[Dict[str, Any]]]:
+    """Daily points for the recent window, weekly averages before it"""
+    dates, weights, ema = trend['dates'], trend['weights'], trend['ema']
+    if not dates:
+        return {'daily': [], 'weekly': []}
+
+    cutoff = bisect_left(dates, dates[-1] - daily_days)
+
+    daily = []
+    for i in range(cutoff, len(dates)):
+        daily.append({'date': date.fromordinal(dates[i]), 'weight': weights[i], 'trend': round(ema[i], 1)})
+
+    buckets = {}
+    for i in range(cutoff):
+        week = dates[i] - date.fromordinal(dates[i]).weekday()
+        bucket = buckets.setdefault(week, [0.0, 0, 0.0])
+        bucket[0] += weights[i]
+        bucket[1] += 1
+        bucket[2] = ema[i]
+
+    weekly = [
+        {'week': date.fromordinal(week), 'weight': round(total / count, 1), 'trend': round(last_ema, 1)}
+        for week, (total, count, last_ema) in sorted(buckets.items())
+    ]
+    return {'daily': daily, 'weekly': weekly}
+
+def get_weight_trend(client_id: str) -> Dict[str, Any]:
+    """Get a client's stored weight trend, building it from the Weight Log if missing"""
+    key = get_weight_trend_key(client_id)
+    trend = frappe.cache().get_value(key)
+    if trend is None:
+        trend = build_weight_trend(frappe.get_all(
+            "Weight Log",
+            filters={"parenttype": "Client", "parent": client_id},
+            fields=["weight", "date"],
+            order_by="date asc, idx asc"
+        ))
+        frappe.cache().set_value(key, trend)
+    return trend
+
+def update_weight_trend(client_doc: Any) -> None:
+    """Apply Weight Log changes of a saved client to the stored trend"""
+    cache = frappe.cache()
+    key = get_weight_trend_key(client_doc.name)
+    trend = cache.get_value(key)
+    if trend is None:
+        # Not built yet, it will be built from the database on first read
+        return
+
+    before = client_doc.get_doc_before_save()
+    old_rows = {row.name: (row.weight, str(row.date)) for row in (before.get('weight') or [])} if before else None
+    new_rows = client_doc.get('weight') or []
+
+    unchanged = False
+    if old_rows is not None:
+        kept = [row for row in new_rows if row.name in old_rows]
+        appended = [row for row in new_rows if row.name not in old_rows]
+        unchanged = len(kept) == len(old_rows) and all(
+            old_rows[row.name] == (row.weight, str(row.date)) for row in kept
+        )
+
+    if unchanged:
+        for row in appended:
+            if row.date:
+                append_weight(trend, row.date, row.weight)
+        trend['summary'] = summarize_trend(trend)
+    else:
+        trend = build_weight_trend(new_rows)
+
+    cache.set_value(key, trend)
+
+def invalidate_weight_trend(client_id: str) -> None:
+    frappe.cache().delete_value(get_weight_trend_key(client_id))